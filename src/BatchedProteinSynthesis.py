@@ -0,0 +1,246 @@
+"""
+    ================================================================
+    A python class to simulate many independent mRNA translation
+    trajectories at once. Every lattice is a row of a 2D array and
+    all trajectories advance by one Gillespie event per step using
+    vectorised NumPy operations. Propensities are grouped in blocks
+    of about sqrt(L) sites whose sums are kept up to date, so an
+    event costs O(sqrt(L)) per trajectory rather than O(L).
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+import numpy as np
+
+
+class BatchedProteinSynthesis(object):
+    """
+        A class to simulate a batch of mRNA translation trajectories.
+        Row i of taus and a holds the lattice and propensities of
+        trajectory i, following the rules of ProteinSynthesis.update.
+        =======================================================
+        Attributes:
+        length - int, length of ribosome.
+        size - int, size of mRNA strand.
+        alpha - float, initiation rate of ribosome attaching to mRNA strand.
+        omegas - ndarray, array of transition rates between codon sites.
+        n_traj - int, number of trajectories in the batch.
+        rng - numpy.random.Generator, source of random numbers.
+        block - int, number of sites per block of propensities.
+    """
+
+    def __init__(self, length, size, alpha, omegas, n_traj, rng=None):
+        # Initialising parameters.
+        self.length = int(length)
+        self.size = int(size)
+        self.alpha = float(alpha)
+        self.omegas = np.asarray(omegas, dtype=float)
+        self.n_traj = int(n_traj)
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.block = max(1, int(np.ceil(np.sqrt(self.size))))
+        self.n_blocks = -(-self.size // self.block)
+        self.build_strands()
+        self.build_propensities()
+
+    def build_strands(self):
+        """
+            Creates one empty lattice per trajectory.
+        """
+        self.taus = np.zeros((self.n_traj, self.size), dtype=np.int8)
+        self.occupation = np.zeros(self.n_traj, dtype=int)
+        # Furthest site any ribosome in the batch has reached.
+        self.reach = 0
+
+    def build_propensities(self):
+        """
+            Creates the propensity arrays, only initiation is
+            possible on an empty lattice. The rows are padded to a
+            whole number of blocks, and block_sums holds the sum of
+            every block.
+        """
+        self.a = np.zeros((self.n_traj, self.n_blocks * self.block))
+        self.a[:, 0] = self.alpha
+        self.block_sums = np.zeros((self.n_traj, self.n_blocks))
+        self.block_sums[:, 0] = self.alpha
+
+    def refresh(self, rows, sites):
+        """
+            Recomputes the sums of the blocks holding the given
+            (row, site) propensities after they changed.
+        """
+        blocks = sites // self.block
+        blocks_view = self.a.reshape(self.a.shape[0], self.n_blocks,
+                                     self.block)
+        self.block_sums[rows, blocks] = blocks_view[rows, blocks].sum(axis=1)
+
+    def get_cumulative(self):
+        """
+            Row-wise cumulative sums of the block sums. Blocks
+            beyond the furthest ribosome are all zero and skipped.
+        """
+        return np.cumsum(self.block_sums[:, :self.reach // self.block + 1],
+                         axis=1)
+
+    def get_R(self, cumulative):
+        """
+            Calculates R for every trajectory.
+        """
+        return cumulative[:, -1]
+
+    def get_random_times(self, R):
+        """
+            Samples one exponential waiting time per trajectory.
+        """
+        return self.rng.standard_exponential(R.size) / R
+
+    def get_transitions(self, cumulative, R):
+        """
+            Draws the transition of every trajectory from the
+            row-wise cumulative sums of the propensities.
+        """
+        r = (1.0 - self.rng.random(R.size)) * R
+        rows = np.arange(R.size)
+        # Block holding the transition, then the site within it.
+        blocks = np.sum(cumulative < r[:, None], axis=1)
+        before = np.where(blocks > 0,
+                          cumulative[rows, np.maximum(blocks - 1, 0)], 0.0)
+        a = self.a.reshape(R.size, self.n_blocks, self.block)[rows, blocks]
+        sites = np.sum(np.cumsum(a, axis=1) < (r - before)[:, None], axis=1)
+        # Rounding may run past the block, fall back on its last
+        # site with a non-zero propensity.
+        over = sites >= self.block
+        if over.any():
+            sites[over] = self.block - 1 - np.argmax(a[over, ::-1] > 0, axis=1)
+        return blocks * self.block + sites
+
+    def update(self, index):
+        """
+            Realises the chosen transition in every trajectory.
+        """
+        l = self.length
+        rows = np.arange(index.size)
+        taus = self.taus
+        a = self.a
+        omegas = self.omegas
+
+        # Initiation.
+        init = rows[index == 0]
+        taus[init, 1] = 1
+        a[init, 0] = 0
+        a[init, 1] = omegas[1] * (1 - taus[init, l + 1])
+        self.occupation[init] += 1
+
+        # Detaching from lattice.
+        term = rows[index == self.size - 1]
+        behind = self.size - 1 - l
+        taus[term, self.size - 1] = 0
+        a[term, self.size - 1] = 0
+        a[term, behind] = omegas[behind] * taus[term, behind]
+        self.occupation[term] -= 1
+
+        # Elongation.
+        elong = rows[(index > 0) & (index < self.size - 1)]
+        site = index[elong]
+        taus[elong, site] = 0
+        taus[elong, site + 1] = 1
+        a[elong, site] = 0
+        ahead = site + 1 + l
+        free = np.where(ahead < self.size,
+                        1 - taus[elong, np.minimum(ahead, self.size - 1)], 1)
+        a[elong, site + 1] = omegas[site + 1] * free
+        # Initiation site freed.
+        freed = elong[site == l]
+        a[freed, 0] = self.alpha
+        # Potential unblocking.
+        unblock = site > l
+        rows_b = elong[unblock]
+        site_b = site[unblock] - l
+        a[rows_b, site_b] = omegas[site_b] * taus[rows_b, site_b]
+        self.refresh(np.concatenate((init, init, term, term, elong, elong,
+                                     freed, rows_b)),
+                     np.concatenate((np.zeros(init.size, dtype=int),
+                                     np.ones(init.size, dtype=int),
+                                     np.full(term.size, self.size - 1),
+                                     np.full(term.size, behind),
+                                     site, site + 1,
+                                     np.zeros(freed.size, dtype=int),
+                                     site_b)))
+        # Furthest site reached.
+        if site.size > 0:
+            self.reach = max(self.reach, int(site.max()) + 1)
+        elif init.size > 0:
+            self.reach = max(self.reach, 1)
+
+    def keep(self, mask):
+        """
+            Drops every trajectory for which mask is False.
+        """
+        self.taus = self.taus[mask]
+        self.a = self.a[mask]
+        self.block_sums = self.block_sums[mask]
+        self.occupation = self.occupation[mask]
+
+    def run(self, T, dt, n_meas):
+        """
+            Runs every trajectory up to the horizon T. Returns the
+            occupation number summed over the batch on the
+            measurement grid, and the initiation time and T1 of the
+            tagged (first) ribosome of each trajectory (NaN when
+            not reached before the horizon). The summed squared
+            occupation is left in square_densities.
+        """
+        n = self.n_traj
+        ids = np.arange(n)
+        t = np.zeros(n)
+        ribosome_pos = np.ones(n, dtype=int)
+        check = np.zeros(n, dtype=bool)
+        initiation_times = np.full(n, np.nan)
+        tagged_times = np.full(n, np.nan)
+        # Difference array of the summed occupation on the grid.
+        diff = np.zeros(n_meas + 2)
+        diff_squares = np.zeros(n_meas + 2)
+
+        while ids.size > 0:
+            t_old = t
+            cumulative = self.get_cumulative()
+            R = self.get_R(cumulative)
+            t_new = t_old + self.get_random_times(R)
+            # Grid ticks covered by the waiting time.
+            k1 = np.floor(t_old / dt).astype(int) + 1
+            k2 = np.floor(t_new / dt).astype(int)
+            k2 = np.where(t_new > T, n_meas, np.minimum(k2, n_meas))
+            fill = k1 <= k2
+            occupation = self.occupation[fill]
+            np.add.at(diff, k1[fill], occupation)
+            np.add.at(diff, k2[fill] + 1, -occupation)
+            np.add.at(diff_squares, k1[fill], occupation ** 2)
+            np.add.at(diff_squares, k2[fill] + 1, -occupation ** 2)
+
+            index = self.get_transitions(cumulative, R)
+            self.update(index)
+
+            # Tracking initial ribosome position.
+            hop = ~check & (index + 1 == ribosome_pos)
+            ribosome_pos[hop] += 1
+            started = hop & (ribosome_pos == 2)
+            initiation_times[ids[started]] = t_new[started]
+            done = hop & (ribosome_pos > self.size - 1)
+            tagged_times[ids[done]] = t_new[done] - \
+                initiation_times[ids[done]]
+            check |= done
+
+            # Trajectories past the horizon leave the batch.
+            alive = t_new <= T
+            t = t_new
+            if not alive.all():
+                self.keep(alive)
+                ids = ids[alive]
+                t = t_new[alive]
+                ribosome_pos = ribosome_pos[alive]
+                check = check[alive]
+
+        densities = np.cumsum(diff)[:n_meas + 1]
+        self.square_densities = np.cumsum(diff_squares)[:n_meas + 1]
+        return densities, initiation_times, tagged_times
@@ -0,0 +1,291 @@
+"""
+    ================================================================
+    A python class to simulate the translation of many mRNAs at
+    once, competing for a finite pool of ribosomes. Initiation on
+    an mRNA happens at its rate alpha scaled by the fraction of
+    ribosomes that are free. Events are scheduled with the
+    Gibson-Bruck next reaction method, so an event costs O(log M)
+    in the number of reactions M rather than a scan of every
+    lattice. Ribosome pool statistics and per-gene protein counts
+    are written out as the simulation runs.
+
+    Usage: python CellProteinSynthesis.py <rates> [...] --ribosomes N
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from IndexedPriorityQueue import IndexedPriorityQueue
+from PropensityTree import PropensityTree
+from RateStore import RateStore
+from initiation_rates import load_initiation_rates
+import early_time
+import genome_sweep
+import argparse
+import csv
+import random
+from bisect import bisect_right
+
+# Queue key of the initiation reaction shared by all mRNAs.
+INITIATION = -1
+
+
+class CellProteinSynthesis(object):
+    """
+        A class to simulate a cell's worth of mRNAs. The lattices
+        of all mRNAs are laid end to end in one occupation array,
+        and the hop of the ribosome at site i of mRNA m is the
+        reaction with key offsets[m] + i. Initiation on any mRNA
+        is a single reaction of rate
+            (sum of alpha over mRNAs that can initiate) * free / total
+        whose mRNA is then chosen with a PropensityTree. Only
+        reactions that can fire are kept in the queue.
+        =======================================================
+        Attributes:
+        length - int, length of ribosome.
+        genes - list, gene names.
+        gene_of - list, gene index of every mRNA.
+        alphas - list, initiation rate of every mRNA.
+        sizes - list, lattice size of every mRNA.
+        offsets - list, start of every mRNA in the occupation array.
+        occupied - bytearray, 1 where a ribosome sits.
+        rates - list, hopping rate of every site of every mRNA.
+        n_ribosomes - int, total number of ribosomes.
+        n_free - int, ribosomes not bound to an mRNA.
+        proteins - list, proteins completed per gene.
+        t - float, current time.
+        events - int, number of events so far.
+        rng - random.Random, source of random numbers.
+    """
+
+    def __init__(self, length, genes, alphas, omegas, n_ribosomes,
+                 copies=1, rng=None):
+        # Initialising parameters.
+        self.length = int(length)
+        self.genes = list(genes)
+        self.rng = random if rng is None else rng
+        self.gene_of = []
+        self.alphas = []
+        self.sizes = []
+        self.offsets = []
+        self.rates = []
+        for g in range(len(self.genes)):
+            for _ in range(copies):
+                self.gene_of.append(g)
+                self.alphas.append(float(alphas[g]))
+                self.sizes.append(int(omegas[g].size))
+                self.offsets.append(len(self.rates))
+                self.rates.extend(float(omega) for omega in omegas[g])
+        self.occupied = bytearray(len(self.rates))
+        self.n_ribosomes = int(n_ribosomes)
+        self.n_free = self.n_ribosomes
+        self.proteins = [0] * len(self.genes)
+        self.t = 0.0
+        self.events = 0
+        self.queue = IndexedPriorityQueue()
+        # Every mRNA starts empty and able to initiate.
+        self.initiation = PropensityTree(len(self.alphas))
+        for m, alpha in enumerate(self.alphas):
+            self.initiation[m] = alpha
+        self.schedule_initiation(0.0)
+
+    def get_initiation_rate(self):
+        """
+            Total initiation propensity of the cell.
+        """
+        if self.n_ribosomes == 0:
+            return 0.0
+        return self.initiation.total() * self.n_free / self.n_ribosomes
+
+    def schedule_initiation(self, old_rate):
+        """
+            Reschedules the initiation reaction after its rate has
+            changed from old_rate. A pending firing time is rescaled
+            as in Gibson and Bruck, otherwise a new one is drawn.
+        """
+        rate = self.get_initiation_rate()
+        if rate <= 0.0:
+            self.queue.remove(INITIATION)
+        elif INITIATION in self.queue and old_rate > 0.0:
+            t_next = self.queue.time(INITIATION)
+            self.queue.push(INITIATION,
+                            self.t + old_rate / rate * (t_next - self.t))
+        else:
+            self.queue.push(INITIATION, self.t + self.rng.expovariate(rate))
+
+    def can_hop(self, m, site):
+        """
+            Whether the ribosome at site of mRNA m is not blocked by
+            one length sites ahead.
+        """
+        ahead = site + self.length
+        return ahead >= self.sizes[m] or \
+            not self.occupied[self.offsets[m] + ahead]
+
+    def activate(self, key):
+        """
+            Schedules the hop with the given key.
+        """
+        self.queue.push(key, self.t + self.rng.expovariate(self.rates[key]))
+
+    def initiate(self, m):
+        """
+            A free ribosome binds to site 1 of mRNA m.
+        """
+        old_rate = self.get_initiation_rate()
+        self.queue.remove(INITIATION)
+        self.occupied[self.offsets[m] + 1] = 1
+        self.initiation[m] = 0
+        self.n_free -= 1
+        if self.can_hop(m, 1):
+            self.activate(self.offsets[m] + 1)
+        self.schedule_initiation(old_rate)
+
+    def hop(self, key):
+        """
+            The ribosome of reaction key moves on or, from the last
+            site, terminates and returns to the pool.
+        """
+        m = bisect_right(self.offsets, key) - 1
+        offset = self.offsets[m]
+        site = key - offset
+        old_rate = self.get_initiation_rate()
+        pool_changed = False
+        self.queue.remove(key)
+        self.occupied[key] = 0
+        # Detaching from lattice.
+        if site == self.sizes[m] - 1:
+            self.n_free += 1
+            self.proteins[self.gene_of[m]] += 1
+            pool_changed = True
+        # Elongation.
+        else:
+            self.occupied[key + 1] = 1
+            if self.can_hop(m, site + 1):
+                self.activate(key + 1)
+        # Potential unblocking of the ribosome behind.
+        behind = site - self.length
+        if behind >= 1 and self.occupied[offset + behind]:
+            self.activate(offset + behind)
+        # The initiation region is free again.
+        if site == self.length:
+            self.initiation[m] = self.alphas[m]
+            pool_changed = True
+        if pool_changed:
+            self.schedule_initiation(old_rate)
+
+    def step(self):
+        """
+            Fires the next reaction.
+        """
+        self.t, key = self.queue.top()
+        if key == INITIATION:
+            r = self.rng.uniform(0, 1) * self.initiation.total()
+            self.initiate(self.initiation.find(r))
+        else:
+            self.hop(key)
+        self.events += 1
+
+    def run(self, T, interval, report):
+        """
+            Simulates up to time T, calling report(t) at every
+            multiple t of interval along the way.
+        """
+        next_report = self.t + interval
+        while True:
+            t_next = self.queue.top()[0] if len(self.queue) else float("inf")
+            while next_report <= min(t_next, T):
+                report(next_report)
+                next_report += interval
+            if t_next > T:
+                break
+            self.step()
+        self.t = T
+
+    def get_bound(self):
+        """
+            Number of ribosomes on mRNAs.
+        """
+        return self.n_ribosomes - self.n_free
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Translation of many mRNAs sharing a ribosome pool.")
+    parser.add_argument("rates", nargs="+",
+                        help="rates directories, files or glob patterns "
+                        "(gene key patterns with --store)")
+    parser.add_argument("--store", default=None,
+                        help="rate store built by RateStore.py")
+    parser.add_argument("--alphas", default="Initiation-Rates.xlsx",
+                        help="initiation rates workbook")
+    parser.add_argument("--sheet", default="LacZ",
+                        help="sheet of the initiation rates workbook")
+    parser.add_argument("--column", default="B",
+                        help="column of the initiation rates")
+    parser.add_argument("--length", type=int, default=10,
+                        help="ribosome length in codons")
+    parser.add_argument("--copies", type=int, default=1,
+                        help="mRNA copies of every gene")
+    parser.add_argument("--ribosomes", type=int, required=True,
+                        help="number of ribosomes in the cell")
+    parser.add_argument("--time", type=float, default=1000.0,
+                        help="simulated time (s)")
+    parser.add_argument("--interval", type=float, default=10.0,
+                        help="time between output rows (s)")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--output", default="cell",
+                        help="prefix of the <output>_pool.csv and "
+                        "<output>_proteins.csv files")
+    args = parser.parse_args()
+
+    alpha_dict = load_initiation_rates(args.alphas, args.sheet, args.column)
+    if args.store is None:
+        paths = genome_sweep.find_rates(args.rates)
+    else:
+        store = RateStore(args.store)
+        paths = sorted(set(key for pattern in args.rates
+                           for key in store.keys(pattern)))
+    genes = []
+    alphas = []
+    omegas = []
+    for trans_params in paths:
+        gene = early_time.gene_name(trans_params)
+        if alpha_dict.get(gene) is None:
+            continue
+        genes.append(gene)
+        alphas.append(float(alpha_dict[gene]))
+        omegas.append(genome_sweep.load_omegas(trans_params, alphas[-1],
+                                               args.store))
+    print(str(len(genes)) + " genes, " + str(len(genes) * args.copies) +
+          " mRNAs.")
+
+    cell = CellProteinSynthesis(args.length, genes, alphas, omegas,
+                                args.ribosomes, copies=args.copies,
+                                rng=random.Random(args.seed))
+    with open(args.output + "_pool.csv", "w", newline="") as pool_file, \
+            open(args.output + "_proteins.csv", "w", newline="") as protein_file:
+        pool_writer = csv.writer(pool_file)
+        pool_writer.writerow(["t", "free", "bound", "initiation_rate",
+                              "proteins", "events"])
+        protein_writer = csv.writer(protein_file)
+        protein_writer.writerow(["t", "Gene", "proteins"])
+        reported = [0] * len(genes)
+
+        def report(t):
+            pool_writer.writerow([t, cell.n_free, cell.get_bound(),
+                                  cell.get_initiation_rate(),
+                                  sum(cell.proteins), cell.events])
+            # Only genes whose count changed since the last row.
+            for g, count in enumerate(cell.proteins):
+                if count != reported[g]:
+                    protein_writer.writerow([t, genes[g], count])
+                    reported[g] = count
+            pool_file.flush()
+            protein_file.flush()
+
+        cell.run(args.time, args.interval, report)
+
+
+if __name__ == "__main__":
+    main()
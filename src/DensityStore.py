@@ -0,0 +1,222 @@
+"""
+    ================================================================
+    A python class to keep the early time results of many genes in
+    a single HDF5 file (h5py is needed) instead of one text file
+    per gene. Worker processes write shards of their own which are
+    merged into the main file afterwards.
+
+    Usage: python DensityStore.py import <store> <*_density_data.dat>
+           python DensityStore.py merge <store>
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import argparse
+import glob
+import os
+import numpy as np
+
+# Per-gene scalar columns.
+SCALARS = ["T1_exp", "T1_ana", "lambda", "alpha", "n_traj"]
+# Rows of the concatenated series per chunk.
+CHUNK = 4096
+
+
+class DensityStore(object):
+    """
+        A class to append and read the density series of genes.
+        Series are stored column-wise: the measurement times and
+        densities of every gene are concatenated in two chunked,
+        compressed datasets, and each series has a row in the keys,
+        genes, offsets, lengths and scalar datasets. Rows are keyed
+        by the rates file (or RateStore key) of the series, as the
+        same gene appears in several rate sets, and default to the
+        gene name. Reading a row only touches the chunks holding
+        its series. A key appended twice is read back from its
+        latest row.
+        =======================================================
+        Attributes:
+        path - str, the HDF5 file.
+        index - dict, key to its latest row.
+    """
+
+    def __init__(self, path):
+        # Initialising parameters.
+        self.path = str(path)
+        self.index = {}
+        if os.path.exists(self.path):
+            import h5py
+            with h5py.File(self.path, "r") as f:
+                keys = f["keys"].asstr()[:]
+            self.index = {key: row for row, key in enumerate(keys)}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self):
+        """
+            Sorted keys of the series stored.
+        """
+        return sorted(self.index)
+
+    def find(self, gene):
+        """
+            Sorted keys of the series of a gene.
+        """
+        if not self.index:
+            return []
+        import h5py
+        with h5py.File(self.path, "r") as f:
+            genes = f["genes"].asstr()[:]
+        return sorted(key for key, row in self.index.items()
+                      if genes[row] == gene)
+
+    def create(self, f):
+        """
+            Creates the empty, resizable datasets of a new file.
+        """
+        import h5py
+        for name in ("times", "densities"):
+            f.create_dataset(name, shape=(0,), maxshape=(None,),
+                             dtype=np.float64, chunks=(CHUNK,),
+                             compression="gzip", shuffle=True)
+        for name in ("keys", "genes"):
+            f.create_dataset(name, shape=(0,), maxshape=(None,),
+                             dtype=h5py.string_dtype(), chunks=(256,))
+        for name in ["offsets", "lengths"] + SCALARS:
+            f.create_dataset(name, shape=(0,), maxshape=(None,),
+                             dtype=np.float64 if name in SCALARS
+                             else np.int64, chunks=(256,))
+
+    def append(self, rows):
+        """
+            Appends a list of rows, each a dictionary with the gene
+            name, its rates key (the gene name when missing), its
+            measure_times and densities arrays and the SCALARS
+            (missing ones are stored as NaN).
+        """
+        import h5py
+        if not rows:
+            return
+        with h5py.File(self.path, "a") as f:
+            if "genes" not in f:
+                self.create(f)
+            n = f["genes"].shape[0]
+            start = f["times"].shape[0]
+            lengths = [len(row["measure_times"]) for row in rows]
+            offsets = start + np.concatenate(([0], np.cumsum(lengths)[:-1]))
+            total = start + sum(lengths)
+            for name, key in (("times", "measure_times"),
+                              ("densities", "densities")):
+                f[name].resize((total,))
+                if total > start:
+                    f[name][start:total] = np.concatenate(
+                        [np.asarray(row[key], dtype=np.float64)
+                         for row in rows])
+            keys = [row.get("rates", row["Gene"]) for row in rows]
+            columns = {"keys": keys, "genes": [row["Gene"] for row in rows],
+                       "offsets": offsets, "lengths": lengths}
+            for name in SCALARS:
+                columns[name] = [row.get(name, np.nan) for row in rows]
+            for name, values in columns.items():
+                f[name].resize((n + len(rows),))
+                f[name][n:] = values
+        for k, key in enumerate(keys):
+            self.index[key] = n + k
+
+    def read_rows(self, rows=None):
+        """
+            Loads rows (all, superseded ones included, when None)
+            as a list of dictionaries in the format of append.
+        """
+        import h5py
+        result = []
+        with h5py.File(self.path, "r") as f:
+            # The per-row columns are small, the series are sliced.
+            keys = f["keys"].asstr()[:]
+            genes = f["genes"].asstr()[:]
+            columns = {name: f[name][:]
+                       for name in ["offsets", "lengths"] + SCALARS}
+            if rows is None:
+                rows = range(keys.size)
+            for row in rows:
+                start = int(columns["offsets"][row])
+                stop = start + int(columns["lengths"][row])
+                entry = {"Gene": genes[row], "rates": keys[row],
+                         "measure_times": f["times"][start:stop],
+                         "densities": f["densities"][start:stop]}
+                for name in SCALARS:
+                    entry[name] = float(columns[name][row])
+                result.append(entry)
+        return result
+
+    def read(self, keys=None):
+        """
+            Loads the series of keys (all when None) as a
+            dictionary of key to a dictionary of its gene name,
+            measure_times and densities arrays and SCALARS. Only
+            the rows asked for are read.
+        """
+        if keys is None:
+            keys = self.keys()
+        rows = self.read_rows([self.index[key] for key in keys])
+        return dict(zip(keys, rows))
+
+
+def shard_path(path, worker=None):
+    """
+        Shard of the store at path written by a worker, by
+        default the current process.
+    """
+    if worker is None:
+        worker = os.getpid()
+    return "{}.shard{}".format(path, worker)
+
+
+def merge(path, shards=None):
+    """
+        Appends every row of the given shards of the store at path,
+        by default all of them, to it as is, in order of shard name,
+        and removes the shards.
+    """
+    if shards is None:
+        shards = glob.glob(glob.escape(path) + ".shard*")
+    shards = sorted(shards)
+    store = DensityStore(path)
+    for shard in shards:
+        store.append(DensityStore(shard).read_rows())
+        os.remove(shard)
+    return len(shards)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Build or merge a store of early time densities.")
+    parser.add_argument("command", choices=["import", "merge"],
+                        help="import text density files or merge shards")
+    parser.add_argument("store", help="HDF5 store")
+    parser.add_argument("data", nargs="*",
+                        help="<gene>_density_data.dat files to import")
+    args = parser.parse_args()
+
+    if args.command == "merge":
+        print(str(merge(args.store)) + " shards merged into " + args.store)
+        return
+    rows = []
+    for path in args.data:
+        data = np.loadtxt(path, delimiter=",", ndmin=2)
+        gene = os.path.basename(path)
+        if gene.endswith("_density_data.dat"):
+            gene = gene[:-len("_density_data.dat")]
+        rows.append({"Gene": gene, "measure_times": data[:, 0],
+                     "densities": data[:, 1]})
+    DensityStore(args.store).append(rows)
+    print(str(len(rows)) + " genes written to " + args.store)
+
+
+if __name__ == "__main__":
+    main()
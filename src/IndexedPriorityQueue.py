@@ -0,0 +1,126 @@
+"""
+    ================================================================
+    An indexed binary heap of reaction firing times, the priority
+    queue of the Gibson-Bruck next reaction method. The earliest
+    reaction is found in O(1) and inserting, rescheduling or
+    removing a reaction by its key costs O(log M).
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+
+class IndexedPriorityQueue(object):
+    """
+        A class to keep reactions ordered by their putative firing
+        times. Only scheduled reactions are stored, a reaction
+        whose propensity drops to zero is removed.
+        =======================================================
+        Attributes:
+        keys - list, reaction keys in heap order.
+        times - list, firing times in heap order.
+        pos - dict, reaction key to its position in the heap.
+    """
+
+    def __init__(self):
+        # Initialising parameters.
+        self.keys = []
+        self.times = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.pos
+
+    def time(self, key):
+        """
+            Firing time of a scheduled reaction.
+        """
+        return self.times[self.pos[key]]
+
+    def top(self):
+        """
+            Returns the firing time and key of the next reaction.
+        """
+        return self.times[0], self.keys[0]
+
+    def push(self, key, time):
+        """
+            Schedules a reaction at time, rescheduling it if it is
+            already in the queue.
+        """
+        if key in self.pos:
+            i = self.pos[key]
+            old = self.times[i]
+            self.times[i] = time
+            if time < old:
+                self.sift_up(i)
+            else:
+                self.sift_down(i)
+            return
+        self.keys.append(key)
+        self.times.append(time)
+        self.pos[key] = len(self.keys) - 1
+        self.sift_up(len(self.keys) - 1)
+
+    def remove(self, key):
+        """
+            Removes a reaction if it is scheduled.
+        """
+        i = self.pos.pop(key, None)
+        if i is None:
+            return
+        last_key = self.keys.pop()
+        last_time = self.times.pop()
+        if i == len(self.keys):
+            return
+        # Move the last reaction into the hole and restore order.
+        self.keys[i] = last_key
+        self.times[i] = last_time
+        self.pos[last_key] = i
+        self.sift_up(i)
+        self.sift_down(self.pos[last_key])
+
+    def sift_up(self, i):
+        """
+            Moves the reaction at i towards the root.
+        """
+        keys, times, pos = self.keys, self.times, self.pos
+        key, time = keys[i], times[i]
+        while i > 0:
+            parent = (i - 1) >> 1
+            if times[parent] <= time:
+                break
+            keys[i] = keys[parent]
+            times[i] = times[parent]
+            pos[keys[i]] = i
+            i = parent
+        keys[i] = key
+        times[i] = time
+        pos[key] = i
+
+    def sift_down(self, i):
+        """
+            Moves the reaction at i towards the leaves.
+        """
+        keys, times, pos = self.keys, self.times, self.pos
+        n = len(keys)
+        key, time = keys[i], times[i]
+        while True:
+            child = 2 * i + 1
+            if child >= n:
+                break
+            if child + 1 < n and times[child + 1] < times[child]:
+                child += 1
+            if times[child] >= time:
+                break
+            keys[i] = keys[child]
+            times[i] = times[child]
+            pos[keys[i]] = i
+            i = child
+        keys[i] = key
+        times[i] = time
+        pos[key] = i
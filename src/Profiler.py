@@ -0,0 +1,140 @@
+"""
+    ================================================================
+    Optional instrumentation of the simulation drivers. A Profiler
+    records the wall time spent in named phases of a run and counts
+    the events of a simulation by update() branch. Event counting
+    wraps the update method of a single instance, so simulations
+    that are not profiled run unchanged code.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import json
+import time
+from contextlib import contextmanager
+
+BRANCHES = ["initiation", "elongation", "termination", "blocked",
+            "unblocking", "initiation_freed"]
+
+
+class Profiler(object):
+    """
+        A class to collect per-phase wall times and event counts
+        and write them to JSON. Besides initiation, elongation
+        and termination events, hops ending right behind another
+        ribosome (blocked), hops freeing the ribosome behind
+        (unblocking) and hops clearing the initiation region
+        (initiation_freed) are counted for models with taus.
+        =======================================================
+        Attributes:
+        phases - dict, phase name to [seconds, calls].
+        events - dict, update() branch to number of events.
+        start - float, wall clock at creation.
+    """
+
+    def __init__(self):
+        # Initialising parameters.
+        self.phases = {}
+        self.events = dict.fromkeys(BRANCHES, 0)
+        self.start = time.perf_counter()
+
+    @contextmanager
+    def phase(self, name):
+        """
+            Times the body of a with statement as phase name.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals = self.phases.setdefault(name, [0.0, 0])
+            totals[0] += time.perf_counter() - start
+            totals[1] += 1
+
+    def count_events(self, simulation, timed=False):
+        """
+            Replaces the update method of a simulation instance
+            by one that counts the events by branch first. With
+            timed, get_R, get_transition and update are also timed
+            as the selection and update phases, which adds the cost
+            of the clock calls to every event.
+        """
+        update = simulation.update
+        events = self.events
+        last = simulation.size - 1
+        length = simulation.length
+        taus = getattr(simulation, "taus", None)
+
+        def counted_update(index):
+            if index == 0:
+                events["initiation"] += 1
+            elif index == last:
+                events["termination"] += 1
+            else:
+                events["elongation"] += 1
+                if taus is not None and index + 1 + length <= last and \
+                        taus[index + 1 + length]:
+                    events["blocked"] += 1
+            if taus is not None and index > 0:
+                if index == length:
+                    events["initiation_freed"] += 1
+                elif index > length and taus[index - length]:
+                    events["unblocking"] += 1
+            update(index)
+
+        simulation.update = counted_update
+        if timed:
+            simulation.get_R = self.timer("selection", simulation.get_R)
+            simulation.get_transition = self.timer(
+                "selection", simulation.get_transition)
+            simulation.update = self.timer("update", counted_update)
+        return simulation
+
+    def timer(self, name, function):
+        """
+            Wraps function so that its calls are timed as phase
+            name.
+        """
+        totals = self.phases.setdefault(name, [0.0, 0])
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            result = function(*args)
+            totals[0] += clock() - start
+            totals[1] += 1
+            return result
+
+        return timed
+
+    def to_dict(self):
+        """
+            Summary of the run so far.
+        """
+        return {"total_seconds": time.perf_counter() - self.start,
+                "phases": {name: {"seconds": seconds, "calls": calls}
+                           for name, (seconds, calls) in self.phases.items()},
+                "events": dict(self.events)}
+
+    def write(self, path):
+        """
+            Writes the summary to a JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+@contextmanager
+def no_phase(name):
+    """
+        Stand-in for Profiler.phase when profiling is off.
+    """
+    yield
+
+
+def phase(profiler, name):
+    """
+        Times phase name when profiler is not None.
+    """
+    return no_phase(name) if profiler is None else profiler.phase(name)
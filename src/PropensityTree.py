@@ -0,0 +1,84 @@
+"""
+    ================================================================
+    A binary sum tree used to store the transition propensities of
+    the mRNA lattice. Both the total rate and the selection of the
+    next transition cost O(log L) rather than O(L).
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+import numpy as np
+
+
+class PropensityTree(object):
+    """
+        A class to store propensities in a complete binary tree.
+        Every internal node holds the sum of its two children, so
+        the root is always the total rate R.
+        =======================================================
+        Attributes:
+        size - int, number of propensities stored.
+        capacity - int, number of leaves (next power of two).
+        tree - list, flattened tree, leaves start at capacity.
+    """
+
+    def __init__(self, size):
+        # Initialising parameters.
+        self.size = int(size)
+        self.capacity = 1
+        while self.capacity < self.size:
+            self.capacity *= 2
+        self.tree = [0.0] * (2 * self.capacity)
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        """
+            Returns the propensity stored at index.
+        """
+        return self.tree[self.capacity + index]
+
+    def __setitem__(self, index, value):
+        """
+            Sets the propensity at index and refreshes every
+            partial sum on the path back to the root.
+        """
+        tree = self.tree
+        i = self.capacity + index
+        tree[i] = float(value)
+        i >>= 1
+        while i >= 1:
+            tree[i] = tree[2 * i] + tree[2 * i + 1]
+            i >>= 1
+
+    def total(self):
+        """
+            Returns R - the sum of all propensities.
+        """
+        return self.tree[1]
+
+    def find(self, r):
+        """
+            Finds the index j such that the cumulative sum of the
+            propensities up to j first exceeds r.
+        """
+        tree = self.tree
+        i = 1
+        while i < self.capacity:
+            left = tree[2 * i]
+            # Never descend into an empty branch.
+            if r < left or tree[2 * i + 1] == 0.0:
+                i = 2 * i
+            else:
+                r -= left
+                i = 2 * i + 1
+        return i - self.capacity
+
+    def to_array(self):
+        """
+            Returns a copy of the propensities as an ndarray.
+        """
+        return np.array(self.tree[self.capacity:self.capacity + self.size])
@@ -12,7 +12,15 @@
 import numpy as np
 import random
 import math
-import matplotlib.pyplot as plt
+import os
+from PropensityTree import PropensityTree
+
+
+# Observables saved in checkpoints when they have been started.
+CHECKPOINTED = ("t_start", "last_change", "occupied_time", "currents",
+                "batch_size", "window", "z", "capacity", "batch_events",
+                "batch_start", "batch_area", "last_event", "batch_areas",
+                "batch_starts", "n_batches", "t_burn_in", "t_burn_in_error")
 
 
 class ProteinSynthesis(object):
@@ -25,14 +33,23 @@ class ProteinSynthesis(object):
         size - int, size of mRNA strand.
         alpha - float, initiation rate of ribosome attaching to mRNA strand.
         t_rates - ndarray, array of transition rates between codon sites.
+        use_tree - bool, store propensities in a PropensityTree rather
+                   than scanning a flat array (kept for checking results).
+        rng - random.Random, source of random numbers (defaults to the
+              module level generator of random).
+        track_positions - bool, keep the set of occupied sites up to date.
     """
 
-    def __init__(self, length, size, alpha, omegas):
+    def __init__(self, length, size, alpha, omegas, use_tree=True, rng=None,
+                 track_positions=False):
         # Initialising parameters.
         self.length = int(length)
         self.size = int(size)
         self.alpha = float(alpha)
         self.omegas = omegas  # goes from site 1 to site L (site L = beta)
+        self.use_tree = bool(use_tree)
+        self.rng = random if rng is None else rng
+        self.track_positions = bool(track_positions)
         self.build_strand()
         self.build_propensity()
 
@@ -42,13 +59,19 @@ class ProteinSynthesis(object):
             mRNA strand.
         """
         self.taus = np.zeros(self.size, dtype=int)
+        # Ribosome bookkeeping kept up to date by update().
+        self.n_ribosomes = 0
+        self.positions = set() if self.track_positions else None
 
     def build_propensity(self):
         """
             Creates a propensity array in order to tell
             which state transitions are possible.
         """
-        self.a = np.zeros(self.size)
+        if self.use_tree:
+            self.a = PropensityTree(self.size)
+        else:
+            self.a = np.zeros(self.size)
         self.a[0] = self.alpha
 
     def get_R(self):
@@ -56,6 +79,8 @@ class ProteinSynthesis(object):
             Calculates R - the sum of all possible 
             transitions.
         """
+        if self.use_tree:
+            return self.a.total()
         R = np.sum(self.a)
         return (R)
 
@@ -64,14 +89,16 @@ class ProteinSynthesis(object):
             Generates random sample from exponential dist
             in order to perform inverse transform sampling.
         """
-        return (-math.log(random.uniform(0, 1)) / R)
+        return (-math.log(self.rng.uniform(0, 1)) / R)
 
     def get_transition(self, R):
         """
             Finds the index to indicate which transition
             occurs i.e. which ribosome hops.
         """
-        r = random.uniform(0, 1) * R
+        r = self.rng.uniform(0, 1) * R
+        if self.use_tree:
+            return self.a.find(r)
         sum = self.a[0]
         j = 0
         while sum < r:
@@ -84,6 +111,7 @@ class ProteinSynthesis(object):
             Update method to realise the transition
             chosen by the Gillespie Algorithm
         """
+        self.track(index)
         if self.length > 1:
             # Initiation.
             if index == 0:
@@ -175,22 +203,181 @@ class ProteinSynthesis(object):
                 self.a[index - self.length] = self.omegas[index - self.length] \
                     * self.taus[index - self.length]
 
+    def track(self, index):
+        """
+            Updates the ribosome count, and the occupied sites
+            when tracked, for the transition at index.
+        """
+        if index == 0:
+            self.n_ribosomes += 1
+        elif index == self.size - 1:
+            self.n_ribosomes -= 1
+        if self.positions is not None:
+            if index > 0:
+                self.positions.discard(index)
+            if index < self.size - 1:
+                self.positions.add(index + 1)
+
+    def count_ribosomes(self):
+        """
+            Rebuilds the ribosome bookkeeping from taus, needed
+            after taus is modified outside update().
+        """
+        self.n_ribosomes = int(np.sum(self.taus))
+        if self.positions is not None:
+            self.positions = set(np.flatnonzero(self.taus).tolist())
+
+    def set_state(self, taus):
+        """
+            Places ribosomes as given by taus (1 on the site each
+            ribosome occupies) and rebuilds the propensities, e.g.
+            to warm-start from the steady state of a neighbouring
+            parameter point.
+        """
+        self.taus[:] = taus
+        self.taus[0] = 0
+        sites = np.arange(1, self.size)
+        ahead = sites + self.length
+        blocked = np.zeros(self.size - 1, dtype=int)
+        inside = ahead < self.size
+        blocked[inside] = self.taus[ahead[inside]]
+        rates = self.omegas[1:] * self.taus[1:] * (1 - blocked)
+        for site in range(1, self.size):
+            self.a[site] = rates[site - 1]
+        # Initiation needs the first length sites free.
+        free = not np.any(self.taus[1:self.length + 1])
+        self.a[0] = self.alpha if free else 0
+        self.count_ribosomes()
+
     def get_occupation_number(self):
         """
             A method to determine the total number
             of ribosomes occupying the mRNA strand.
         """
-        return np.sum(self.taus)
+        return self.n_ribosomes
+
+    def get_positions(self):
+        """
+            Iterates over the occupied sites in no particular
+            order, O(N) in the number of ribosomes. Requires
+            track_positions.
+        """
+        return iter(self.positions)
+
+    def start_detection(self, t, n=100, window=10, z=2.0, capacity=128):
+        """
+            Begins steady state detection at time t. The time
+            weighted occupation number is averaged over batches of
+            n events. At most capacity batch means are kept: once
+            they are all used, neighbouring batches are merged in
+            pairs and n doubles, so the means always span the whole
+            run. After every batch the MSER truncation point d, the
+            number of leading means whose removal minimises the
+            squared standard error of the mean of the rest, is
+            found. Steady state is declared once d lies in the
+            first half of the means and the two halves of the means
+            kept agree to within z standard errors, so both the
+            truncation and the compared windows grow with the run.
+            At least 2 * window batches are needed. Work is O(1)
+            per event and O(capacity) per batch.
+        """
+        self.batch_size = int(n)
+        self.window = int(window)
+        self.z = float(z)
+        self.capacity = 2 * max(int(capacity) // 2, self.window)
+        self.batch_events = 0
+        self.batch_start = float(t)
+        self.batch_area = 0.0
+        self.last_event = float(t)
+        # Integral of the occupation number over, and start time
+        # of, every batch kept.
+        self.batch_areas = np.zeros(self.capacity)
+        self.batch_starts = np.zeros(self.capacity)
+        self.n_batches = 0
+        self.t_burn_in = None
+        self.t_burn_in_error = None
+
+    def detect(self, t):
+        """
+            Accounts for the occupation number held since the
+            previous event up to the event at time t. Must be
+            called before update(). Returns True once steady state
+            has been detected.
+        """
+        self.batch_area += self.n_ribosomes * (t - self.last_event)
+        self.last_event = t
+        self.batch_events += 1
+        if self.batch_events < self.batch_size:
+            return False
+        self.batch_events = 0
+        return self.add_batch(self.batch_area, t)
 
-    def ss_test(self, occ_num_new, occ_num_old, tolerance):
+    def add_batch(self, area, t):
         """
-            A method to determine the waiting time
-            for the system to reach a steady state.
-       """
-        if (occ_num_new - occ_num_old) <= tolerance * occ_num_old:
+            Closes a batch ending at time t whose integral of the
+            occupation number over time is area, e.g. the sum of
+            the densities accumulated by tasep_kernel.run_events
+            over batch_size events. Returns True once steady state
+            has been detected, with the burn-in time in t_burn_in.
+            Its uncertainty, t_burn_in_error, is the furthest
+            truncation time whose MSER statistic is within the
+            sampling error (z standard errors) of the minimum, and
+            at least the width of the truncated batch.
+        """
+        if self.t_burn_in is not None:
             return True
-        else:
+        self.batch_areas[self.n_batches] = area
+        self.batch_starts[self.n_batches] = self.batch_start
+        self.n_batches += 1
+        self.batch_start = t
+        self.batch_area = 0.0
+        if self.n_batches < self.capacity:
             return False
+        if self.stationary(t):
+            return True
+        # Merging neighbouring batches in pairs.
+        half = self.capacity // 2
+        self.batch_areas[:half] = self.batch_areas[0::2] + \
+            self.batch_areas[1::2]
+        self.batch_starts[:half] = self.batch_starts[0::2]
+        self.n_batches = half
+        self.batch_size *= 2
+        return False
+
+    def stationary(self, t):
+        """
+            Runs the MSER and halves tests over the batch means
+            kept, the last batch ending at time t, and sets the
+            burn-in time and its uncertainty when both pass.
+        """
+        n = self.n_batches
+        starts = self.batch_starts[:n]
+        ends = np.append(starts[1:], t)
+        means = self.batch_areas[:n] / np.maximum(ends - starts, 1e-300)
+        # MSER statistic of every truncation point keeping at least
+        # window batches.
+        kept = np.arange(n, 0, -1)[:n - self.window + 1]
+        sums = np.cumsum(means[::-1])[::-1][:kept.size]
+        squares = np.cumsum(means[::-1] ** 2)[::-1][:kept.size]
+        mser = np.maximum(squares / kept - (sums / kept) ** 2, 0.0) / kept
+        d = int(np.argmin(mser))
+        if 2 * d > n:
+            return False
+        # The halves of what is kept must agree. Batch means are
+        # correlated over long times, so the error comes from the
+        # spread of four group means within each half.
+        h = (n - d) // 2
+        first = [np.mean(g) for g in np.array_split(means[d:d + h], 4)]
+        second = [np.mean(g) for g in np.array_split(means[n - h:], 4)]
+        se = math.sqrt((np.var(first, ddof=1) + np.var(second, ddof=1)) / 4)
+        if abs(np.mean(second) - np.mean(first)) > self.z * se:
+            return False
+        close = mser <= mser[d] * (1.0 + self.z * math.sqrt(2.0 / (n - d - 1)))
+        self.t_burn_in = starts[d]
+        self.t_burn_in_error = max(np.max(np.abs(starts[:kept.size][close] -
+                                                 starts[d])),
+                                   ends[d] - starts[d])
+        return True
 
     def get_densities(self, state, t1, t0):
         """
@@ -200,50 +387,192 @@ class ProteinSynthesis(object):
         densities = state * (t1 - t0)
         return densities
 
-    def plot_density(self, x_data, y_data, t_1, gene):
+    def start_measurement(self, t):
+        """
+            Begins the streaming measurement of time weighted
+            densities and currents at time t. Memory is O(L)
+            however many events are measured.
+        """
+        self.t_start = t
+        self.last_change = np.full(self.size, float(t))
+        self.occupied_time = np.zeros(self.size)
+        self.currents = np.zeros(self.size)
+
+    def measure(self, index, t):
+        """
+            Accumulates the observables for the transition at
+            index occurring at time t. Must be called before
+            update(index) and only touches the (at most two)
+            sites the transition changes.
+        """
+        for site in (index, index + 1):
+            if 0 < site < self.size:
+                self.occupied_time[site] += self.taus[site] * \
+                    (t - self.last_change[site])
+                self.last_change[site] = t
+        self.currents[index] += 1
+
+    def get_ss_densities(self, t):
+        """
+            Time averaged density of every site between the start
+            of the measurement and time t.
+        """
+        occupied_time = self.occupied_time + \
+            self.taus * (t - self.last_change)
+        return occupied_time / (t - self.t_start)
+
+    def get_ss_currents(self, t):
+        """
+            Hops per unit time out of every site between the start
+            of the measurement and time t.
+        """
+        return self.currents / (t - self.t_start)
+
+    def start_recording(self, capacity=1024):
+        """
+            Begins logging every transition and its time into a
+            preallocated buffer which doubles when full.
+        """
+        self.n_recorded = 0
+        self.record_times = np.zeros(capacity)
+        self.record_index = np.zeros(capacity, dtype=int)
+
+    def record(self, index, t):
+        """
+            Logs the transition at index occurring at time t.
+        """
+        if self.n_recorded == self.record_times.size:
+            self.record_times = np.resize(self.record_times,
+                                          2 * self.n_recorded)
+            self.record_index = np.resize(self.record_index,
+                                          2 * self.n_recorded)
+        self.record_times[self.n_recorded] = t
+        self.record_index[self.n_recorded] = index
+        self.n_recorded += 1
+
+    def get_recorded_occupation(self, times):
+        """
+            Ribosome count at each of the given times built from
+            the recorded transitions in one pass. A transition
+            occurring exactly at a grid time is counted after it.
+        """
+        index = self.record_index[:self.n_recorded]
+        deltas = (index == 0).astype(int) - (index == self.size - 1)
+        occupation = np.zeros(self.n_recorded + 1, dtype=int)
+        occupation[1:] = np.cumsum(deltas)
+        before = np.searchsorted(self.record_times[:self.n_recorded],
+                                 times, side="left")
+        return occupation[before]
+
+    def get_recorded_ribosomes(self):
+        """
+            Initiation times of every recorded ribosome, in order of
+            initiation, with the times they reached the last site
+            and completed. Ribosomes cannot overtake, so the k-th
+            ribosome is the k-th to make any hop. Times a ribosome
+            had not reached when recording stopped are infinite.
+        """
+        index = self.record_index[:self.n_recorded]
+        times = self.record_times[:self.n_recorded]
+        starts = times[index == 0]
+        arrivals = np.full(starts.size, np.inf)
+        completions = np.full(starts.size, np.inf)
+        arrived = times[index == self.size - 2]
+        arrivals[:arrived.size] = arrived
+        done = times[index == self.size - 1]
+        completions[:done.size] = done
+        return starts, arrivals, completions
+
+    def get_recorded_site_densities(self, times):
+        """
+            Occupation of every site at each of the given times,
+            an array of shape (times, size), built from the
+            recorded transitions.
+        """
+        index = self.record_index[:self.n_recorded]
+        # First grid time following each transition.
+        tick = np.searchsorted(times, self.record_times[:self.n_recorded],
+                               side="right")
+        changes = np.zeros((len(times) + 1, self.size), dtype=int)
+        leave = index > 0
+        np.add.at(changes, (tick[leave], index[leave]), -1)
+        enter = index < self.size - 1
+        np.add.at(changes, (tick[enter], index[enter] + 1), 1)
+        return np.cumsum(changes, axis=0)[:len(times)]
+
+    def save_checkpoint(self, path, t, **extra):
+        """
+            Writes the lattice, the clock t, the state of the random
+            number generator and any accumulated observables to
+            path, O(L) in size. Extra values, e.g. the number of
+            events done, are saved alongside. The file is written
+            under a temporary name and moved into place, so a
+            checkpoint is never left half written.
+        """
+        version, state, gauss = self.rng.getstate()
+        arrays = {"taus": self.taus, "t": t, "rng_version": version,
+                  "rng_state": np.array(state, dtype=np.uint64),
+                  "rng_gauss": np.nan if gauss is None else gauss}
+        for name in CHECKPOINTED:
+            if getattr(self, name, None) is not None:
+                arrays["obs_" + name] = getattr(self, name)
+        for name, value in extra.items():
+            arrays["extra_" + name] = value
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, path)
+
+    def load_checkpoint(self, path):
+        """
+            Restores the state saved by save_checkpoint. The
+            propensities are rebuilt from the lattice. Returns the
+            clock and a dictionary of the extra values.
+        """
+        with np.load(path) as checkpoint:
+            self.set_state(checkpoint["taus"])
+            gauss = float(checkpoint["rng_gauss"])
+            self.rng.setstate((int(checkpoint["rng_version"]),
+                               tuple(int(x) for x in checkpoint["rng_state"]),
+                               None if np.isnan(gauss) else gauss))
+            extra = {}
+            for key in checkpoint.files:
+                value = checkpoint[key]
+                if value.ndim == 0:
+                    value = value.item()
+                if key.startswith("obs_"):
+                    setattr(self, key[len("obs_"):], value)
+                elif key.startswith("extra_"):
+                    extra[key[len("extra_"):]] = value
+            t = float(checkpoint["t"])
+        if hasattr(self, "batch_size"):
+            # Not saved until steady state has been detected.
+            for name in ("t_burn_in", "t_burn_in_error"):
+                if not hasattr(self, name):
+                    setattr(self, name, None)
+        return t, extra
+
+    def plot_density(self, x_data, y_data, t_1, gene, show=False):
         """
             Density plotter for mRNA strand.
             t_1 - Time for first ribsome to terminate.
         """
-        plt.title("Lattice Site Density" + " | Gene: " + gene)
-        plt.xlabel("Time (s)")
-        plt.ylabel(r"Denisty [$\rho$]")
-        plt.plot(x_data, y_data)
-        plt.axvline(x=t_1, color='r', linestyle='--')
-        plt.axhline(y=y_data.max(), color='b', linestyle='--')
-        plt.savefig("density_plots/" + gene + "_plot.png")
-        plt.show()
+        import render
+        render.density_plot(x_data, y_data, t_1, gene, show)
 
-    def plot_ss_density(self, x_data, y_data):
+    def plot_ss_density(self, x_data, y_data, show=False):
         """
             Density plotter for mRNA strand in
             steady state.
         """
-        plt.figure(figsize=(10,8))
-        plt.title("Lattice Site Density", fontsize = 21)
-        plt.xlabel("Time (s)", fontsize = 16)
-        plt.ylabel(r"Denisty [$\rho$]", fontsize = 16)
-        plt.ylim(0.2, 0.5)
-        plt.plot(x_data, y_data, 'g')
-        plt.xticks(fontsize = 16)
-        plt.yticks(fontsize = 16)
-        plt.savefig("ss_density.png")
-        plt.show()
+        import render
+        render.ss_density_plot(x_data, y_data, show)
 
-    def plot_current(self, x_data, y_data):
+    def plot_current(self, x_data, y_data, show=False):
         """
             Current plotter for mRNA strand.
         """
-        plt.figure(figsize=(10,8))
-        plt.title("Lattice Site Current", fontsize = 21)
-        plt.xlabel("Lattice Site", fontsize = 16)
-        plt.ylabel("Current [J]", fontsize = 16)
-        plt.ylim(0.1, 0.3)
-        plt.plot(x_data, y_data, 'r')
-        plt.xticks(fontsize = 16)
-        plt.yticks(fontsize = 16)
-        plt.savefig("ss_current.png")
-        plt.show()
+        import render
+        render.current_plot(x_data, y_data, show)
 
     def save_data(self, x_data, y_data, gene):
         """
@@ -1,16 +1,72 @@
 from ProteinSynthesis import ProteinSynthesis
-import sys
+from Profiler import Profiler, phase
+import argparse
+import os
+import time
 import numpy as np
-import matplotlib.pyplot as plt
+
+
+def run_compiled(simulation, mcsteps, n):
+    """
+        Runs the steady state measurement with the compiled
+        kernel, one detector batch (n events, doubling as the
+        run grows) at a time during the burn-in and in a single
+        block afterwards. Returns the time spent in
+        steady state, densities and currents, with a time of 0
+        when steady state was not detected within mcsteps events.
+    """
+    # Imported here as numba is slow to import.
+    import tasep_kernel
+    args = (simulation.taus, simulation.a, simulation.omegas,
+            simulation.alpha, simulation.length)
+    # Burn-in observables are discarded.
+    scratch_densities = np.zeros(simulation.size)
+    scratch_currents = np.zeros(simulation.size)
+    densities = np.zeros(simulation.size)
+    currents = np.zeros(simulation.size)
+    t = 0.0
+    simulation.start_detection(t, n=n)
+    outcome = False
+    i = 0
+    # Determine time to reach steady state.
+    while outcome == False and i < mcsteps:
+        block = min(simulation.batch_size, mcsteps - i)
+        scratch_densities[:] = 0
+        t += tasep_kernel.run_events(*args, block,
+                                     scratch_densities, scratch_currents)
+        i += block
+        # Time integral of the occupation number over the block.
+        outcome = simulation.add_batch(np.sum(scratch_densities[1:]), t)
+    simulation.count_ribosomes()
+    if outcome == False:
+        return 0.0, densities, currents
+    # Collect data after steady state reached.
+    t_s = tasep_kernel.run_events(*args, mcsteps - i, densities, currents)
+    return t_s, densities, currents
 
 
 def main():
-    if len(sys.argv) != 2:
-        print("Wrong number of arguments.")
-        print("Usage: " + sys.argv[0] + " <parameters file>")
-        quit()
-    else:
-        infile_parameters = sys.argv[1]
+    parser = argparse.ArgumentParser(
+        description="Steady state behaviour of mRNA translation.")
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("--engine", choices=["python", "compiled"],
+                        default="python", help="simulation engine")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file, resumed from when it exists "
+                        "(python engine only)")
+    parser.add_argument("--checkpoint-every", type=float, default=10.0,
+                        help="seconds between checkpoints")
+    parser.add_argument("--profile", default=None,
+                        help="write phase timings and event counts "
+                        "(python engine) to this JSON file")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="only save the data, plot later with render.py")
+    parser.add_argument("--show", action="store_true",
+                        help="show the plots as well as saving them")
+    args = parser.parse_args()
+    if args.checkpoint is not None and args.engine != "python":
+        parser.error("--checkpoint needs the python engine")
+    infile_parameters = args.parameters
 
     # open input file and assinging parameters
     with open(infile_parameters, "r") as input_file:
@@ -24,62 +80,112 @@ def main():
         beta = float(items[3])   # Detach rate.
         mcsteps = int(items[4])  # Monte Carlo steps.
         n = int(items[5])        # MC sampling frequency.
-        tol = float(items[6])    # Steady state tolerance.
+        tol = float(items[6])    # Steady state tolerance (unused).
     omegas = np.ones(L) * 1.0    # Transition Rates.
     omegas[0] = 0                # Nothing will occupy first site.
     omegas[-1] = beta            # Detatch at final site.
 
     # Create instance of the simulation.
-    simulation = ProteinSynthesis(length=l, size=L, alpha=alpha, omegas=omegas)
-    # Setting time domains.
-    time_steps = np.zeros(mcsteps)  # Array of all time step sizes.
-    times = np.zeros(mcsteps)      # Cumulative sum of times.
-    # Setting densities and initial state.
-    state = np.zeros(simulation.size)
-    densities = np.zeros(simulation.size)
-    currents = np.zeros(simulation.size)
-    # Initial number of ribosomes on mRNA strand.
-    occ_num = 0
+    simulation = ProteinSynthesis(length=l, size=L, alpha=alpha, omegas=omegas,
+                                  use_tree=(args.engine == "python"))
+    profiler = None if args.profile is None else Profiler()
+    if args.engine == "compiled":
+        with phase(profiler, "simulate"):
+            t_s, densities, currents = run_compiled(simulation, mcsteps, n)
+        if t_s > 0:
+            with phase(profiler, "report"):
+                report(simulation, t_s, densities, currents,
+                       not args.no_plot, args.show)
+        else:
+            not_reached(simulation, mcsteps)
+        if profiler is not None:
+            profiler.write(args.profile)
+        return
+    if profiler is not None:
+        profiler.count_events(simulation, timed=True)
+
+    # Running clock.
+    t = 0.0
+    simulation.start_detection(t, n=n)
     # For determining time to reach steady state.
     outcome = False
-    ss_time = 0  # Steady state time.
+    start = 0
+    if args.checkpoint is not None and os.path.exists(args.checkpoint):
+        t, extra = simulation.load_checkpoint(args.checkpoint)
+        start = int(extra["events"])
+        outcome = bool(extra["outcome"])
+    last_save = time.monotonic()
 
     # Simulation begins.
-    for i in range(mcsteps):
-        print(i)
-        # Collect all possible moves.
-        R = simulation.get_R()
-        # Increase time.
-        time_steps[i] = simulation.get_random_time(R)
-        times[i] = np.sum(time_steps[:i + 1])
-        # Choose which ribosome moves.
-        index = simulation.get_transition(R)
-        # Update simulation - ribosome hops.
-        simulation.update(index)
-        # Collect data after steady state reached.
-        if ss_time != 0:
-            densities += simulation.get_densities(state,
-                                                  (times[i] - ss_time), (times[i - 1] - ss_time))
-            currents[index] += 1
-        # Store updated state.
-        state = np.array(simulation.taus)
-
-        # Determine time to reach steady state.
-        if i % n == 0 and outcome == False:
-            occ_num_new = simulation.get_occupation_number()
-            outcome = simulation.ss_test(occ_num_new, occ_num, tol)
-            occ_num = occ_num_new
+    with phase(profiler, "simulate"):
+        for i in range(start, mcsteps):
+            # Checkpoint every so often, checking the clock every n events.
+            if args.checkpoint is not None and i % n == 0 and \
+                    time.monotonic() - last_save >= args.checkpoint_every:
+                simulation.save_checkpoint(args.checkpoint, t, events=i,
+                                           outcome=outcome)
+                last_save = time.monotonic()
+            # Collect all possible moves.
+            R = simulation.get_R()
+            # Increase time.
+            t += simulation.get_random_time(R)
+            # Choose which ribosome moves.
+            index = simulation.get_transition(R)
+            # Collect data after steady state reached.
             if outcome == True:
-                ss_time = times[i]
+                simulation.measure(index, t)
+            # Determine time to reach steady state.
+            elif simulation.detect(t):
+                outcome = True
+                simulation.start_measurement(t)
+            # Update simulation - ribosome hops.
+            simulation.update(index)
+
+    if outcome == False or t == simulation.t_start:
+        not_reached(simulation, mcsteps)
+    else:
+        # Time spent in steady state
+        t_s = t - simulation.t_start
+        with phase(profiler, "report"):
+            report(simulation, t_s, simulation.get_ss_densities(t) * t_s,
+                   simulation.get_ss_currents(t) * t_s, not args.no_plot,
+                   args.show)
+    if profiler is not None:
+        profiler.write(args.profile)
+
+
+def not_reached(simulation, mcsteps):
+    """
+        Reports a run too short to detect steady state, or to
+        measure anything after detecting it. Nothing is saved.
+    """
+    if simulation.t_burn_in is None:
+        print("Steady state not detected within " + str(mcsteps) +
+              " events, nothing measured.")
+    else:
+        print("Steady state detected at the last event, nothing measured.")
+
 
-    # Time spent in steady state
-    t_s = times[-1] - ss_time
+def report(simulation, t_s, densities, currents, plot=True, show=False):
+    """
+        Prints, saves and optionally plots the steady state
+        observables. The data files can be plotted later with
+        render.py.
+    """
+    print("Burn-in: " + str(simulation.t_burn_in) + " +/- " +
+          str(simulation.t_burn_in_error))
     print(t_s)
     print(np.mean(densities[1:] / t_s))
     print(np.mean(currents / t_s))
-    # Plotting
-    simulation.plot_ss_density(np.arange(1, simulation.size, 1), densities[1:] / t_s)
-    simulation.plot_current(np.arange(0, simulation.size, 1), currents / t_s)
+    sites = np.arange(0, simulation.size, 1)
+    # Saving data, ss_density_data.dat and ss_current_data.dat.
+    simulation.save_data(sites[1:], densities[1:] / t_s, "ss")
+    with open("ss_current_data.dat", "w+") as f:
+        f.writelines(map("{}, {}\n".format, sites, currents / t_s))
+    if plot:
+        simulation.plot_ss_density(sites[1:], densities[1:] / t_s, show)
+        simulation.plot_current(sites, currents / t_s, show)
 
 
-main()
+if __name__ == "__main__":
+    main()
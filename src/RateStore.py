@@ -0,0 +1,124 @@
+"""
+    ================================================================
+    A python class to hold the translation rates of many genes in
+    one contiguous, memory-mapped binary file. Loading the rates of
+    a gene is a zero-copy slice instead of parsing a text file.
+
+    Usage: python RateStore.py <rates directory> <store>
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import argparse
+import fnmatch
+import json
+import os
+import numpy as np
+
+
+class RateStore(object):
+    """
+        A class to read a rate store written by build(). The store
+        consists of <path>.f64, the rates of every gene packed as
+        float64, and <path>.json, the index mapping each gene key
+        (its rates file path relative to the converted directory,
+        without _rates.dat) to an (offset, length) pair.
+        =======================================================
+        Attributes:
+        path - str, path of the store without extension.
+        index - dict, gene key to (offset, length) in data.
+        data - numpy.memmap, read-only view of all rates.
+    """
+
+    def __init__(self, path):
+        # Initialising parameters.
+        self.path = str(path)
+        with open(self.path + ".json", "r") as f:
+            self.index = {key: tuple(value)
+                          for key, value in json.load(f).items()}
+        self.data = np.memmap(self.path + ".f64", dtype=np.float64, mode="r")
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def keys(self, pattern="*"):
+        """
+            Sorted gene keys matching a glob style pattern,
+            e.g. E_coli/growth-rate-1_6/*.
+        """
+        return sorted(fnmatch.filter(self.index, pattern))
+
+    def length(self, key):
+        """
+            Number of codons of a gene.
+        """
+        return self.index[key][1] - 1
+
+    def omegas(self, key):
+        """
+            Zero-copy view of the transition rates of a gene laid
+            out like ProteinSynthesis.omegas. Site 0 holds 0 as the
+            initiation rate is passed to the simulation separately.
+        """
+        offset, length = self.index[key]
+        return self.data[offset:offset + length]
+
+
+def read_rates(trans_params):
+    """
+        Parses the codon rates of a text rates file.
+    """
+    with open(trans_params, "r") as f:
+        return np.array([float(line.split()[1]) for line in f])
+
+
+def build(root, path):
+    """
+        Converts every *_rates.dat file below root into a rate
+        store at path. Files with non-numeric rates are skipped.
+        Both files are written under temporary names and moved
+        into place once complete.
+    """
+    index = {}
+    offset = 0
+    with open(path + ".f64.tmp", "wb") as f:
+        for directory, _, files in sorted(os.walk(root)):
+            for name in sorted(files):
+                if not name.endswith("_rates.dat"):
+                    continue
+                trans_params = os.path.join(directory, name)
+                key = os.path.relpath(trans_params, root)[:-len("_rates.dat")]
+                try:
+                    rates = read_rates(trans_params)
+                except ValueError:
+                    # e.g. selenoproteins with an in-frame STOP codon.
+                    print("Unreadable rates in " + trans_params + ", skipping.")
+                    continue
+                omegas = np.zeros(rates.size + 1)
+                omegas[1:] = rates
+                omegas.tofile(f)
+                index[key.replace(os.sep, "/")] = (offset, omegas.size)
+                offset += omegas.size
+    with open(path + ".json.tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(path + ".f64.tmp", path + ".f64")
+    os.replace(path + ".json.tmp", path + ".json")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Pack a directory of rates files into a rate store.")
+    parser.add_argument("rates", help="directory of *_rates.dat files")
+    parser.add_argument("store", help="output path without extension")
+    args = parser.parse_args()
+    index = build(args.rates, args.store)
+    print(str(len(index)) + " genes written to " + args.store + ".f64")
+
+
+if __name__ == "__main__":
+    main()
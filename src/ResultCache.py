@@ -0,0 +1,115 @@
+"""
+    ================================================================
+    A python class to cache the early time ensembles of genes on
+    disk. Entries are addressed by a hash of everything that
+    determines the trajectories (the rates, alpha, ribosome length,
+    measurement grid, seed and engine version), so a rerun with
+    unchanged inputs is read back instead of simulated, and a rerun
+    asking for more trajectories only simulates the missing ones
+    (with the batched engine, only when the cached ones fill whole
+    batches).
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import ensemble
+import hashlib
+import os
+import numpy as np
+
+
+class ResultCache(object):
+    """
+        A class to store ensemble results as one .npz file per
+        entry in a directory. The summed densities, initiation
+        times and T1s of the first n_traj trajectories are kept,
+        which is all that is needed to extend the ensemble. The
+        least recently used entries (by modification time, which
+        a hit refreshes) are evicted once the directory grows
+        beyond max_bytes.
+        =======================================================
+        Attributes:
+        directory - str, location of the entries.
+        max_bytes - int, size the entries are kept under.
+    """
+
+    def __init__(self, directory, max_bytes=2**30):
+        # Initialising parameters.
+        self.directory = str(directory)
+        self.max_bytes = int(max_bytes)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, engine, l, alpha, omegas, T, n_meas, seed, batch_size):
+        """
+            Hash of the rates and the ensemble parameters.
+        """
+        h = hashlib.sha256()
+        # Site 0 holds alpha when read from a rates file and 0 from
+        # a RateStore, neither is a rate, so it is left out.
+        h.update(np.ascontiguousarray(omegas[1:], dtype=np.float64).tobytes())
+        h.update(ensemble.ensemble_key(engine, l, alpha, omegas, T, n_meas,
+                                       seed, batch_size).encode())
+        return h.hexdigest()
+
+    def path(self, key):
+        """
+            File holding an entry.
+        """
+        return os.path.join(self.directory, key + ".npz")
+
+    def get(self, key):
+        """
+            Returns the number of trajectories, summed densities,
+            initiation times and T1s of an entry, or None.
+        """
+        path = self.path(key)
+        try:
+            with np.load(path) as entry:
+                result = (int(entry["n_traj"]), entry["densities"],
+                          entry["initiation_times"], entry["tagged_times"])
+            os.utime(path)
+        except (OSError, KeyError, ValueError):
+            return None
+        return result
+
+    def put(self, key, n_traj, densities, initiation_times, tagged_times):
+        """
+            Stores an entry unless a larger one is already cached,
+            then evicts entries down to max_bytes.
+        """
+        cached = self.get(key)
+        if cached is not None and cached[0] >= n_traj:
+            return
+        path = self.path(key)
+        tmp = path + ".tmp.npz"
+        np.savez_compressed(tmp, n_traj=n_traj, densities=densities,
+                            initiation_times=initiation_times,
+                            tagged_times=tagged_times)
+        os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """
+            Removes the least recently used entries until the
+            cache fits in max_bytes.
+        """
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".npz") or name.endswith(".tmp.npz"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                # Already evicted by another process.
+                pass
+            total -= size
@@ -0,0 +1,100 @@
+"""
+    ================================================================
+    Running mean and variance of scalar or array valued samples
+    using Welford's algorithm, with Chan's formula to merge the
+    statistics gathered by different workers.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+import numpy as np
+
+
+class RunningStats(object):
+    """
+        A class to accumulate the mean and variance of a stream
+        of samples in O(1) memory per sample shape.
+        =======================================================
+        Attributes:
+        n - int, number of samples.
+        mean - float or ndarray, running mean.
+        m2 - float or ndarray, sum of squared deviations.
+    """
+
+    def __init__(self, n=0, mean=0.0, m2=0.0):
+        # Initialising parameters.
+        self.n = int(n)
+        self.mean = mean
+        self.m2 = m2
+
+    @classmethod
+    def from_sums(cls, n, s1, s2):
+        """
+            Builds the statistics from the sum and the sum of
+            squares of n samples.
+        """
+        if n == 0:
+            return cls()
+        mean = s1 / n
+        return cls(n, mean, np.maximum(s2 - s1 * mean, 0.0))
+
+    def push(self, x):
+        """
+            Adds one sample.
+        """
+        self.n += 1
+        delta = x - self.mean
+        self.mean = self.mean + delta / self.n
+        self.m2 = self.m2 + delta * (x - self.mean)
+
+    def extend(self, xs):
+        """
+            Adds every sample of an iterable.
+        """
+        for x in xs:
+            self.push(x)
+
+    def merge(self, other):
+        """
+            Adds the samples summarised by another RunningStats.
+        """
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self.m2 = other.n, other.mean, other.m2
+            return
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.n / n
+        self.m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+
+    def variance(self):
+        """
+            Unbiased sample variance.
+        """
+        if self.n < 2:
+            return np.inf * np.ones_like(self.mean)
+        return self.m2 / (self.n - 1)
+
+    def sem(self):
+        """
+            Standard error of the mean.
+        """
+        if self.n < 2:
+            return np.inf * np.ones_like(self.mean)
+        return np.sqrt(self.variance() / self.n)
+
+    def rse(self):
+        """
+            Relative standard error of the mean. For array samples
+            this is the ratio of the norms of the standard error
+            and the mean, so sparsely populated entries such as
+            early time densities cannot stall convergence.
+        """
+        mean = np.linalg.norm(np.atleast_1d(self.mean))
+        if self.n < 2 or mean == 0:
+            return np.inf
+        return np.linalg.norm(np.atleast_1d(self.sem())) / mean
@@ -0,0 +1,122 @@
+"""
+    ================================================================
+    A particle based version of ProteinSynthesis. Only the positions
+    of the ribosomes and their hopping rates are stored, so memory
+    and the cost of every event scale with the number of ribosomes
+    rather than the length of the mRNA.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+from ProteinSynthesis import ProteinSynthesis
+from bisect import bisect_left
+
+
+class SparseProteinSynthesis(ProteinSynthesis):
+    """
+        A class to simulate mRNA translation with a sorted list of
+        ribosome positions. Transitions are labelled by site exactly
+        as in ProteinSynthesis (0 is initiation, site i is a hop of
+        the ribosome at i), so both classes can drive the same loop.
+        =======================================================
+        Attributes:
+        positions - list, occupied sites in increasing order.
+        rates - list, hopping rate of the ribosome at each position.
+        a_init - float, current initiation propensity.
+    """
+
+    def build_strand(self):
+        """
+            Creates an empty mRNA strand, i.e. no ribosomes.
+        """
+        self.positions = []
+        self.n_ribosomes = 0
+
+    def build_propensity(self):
+        """
+            Only initiation is possible on an empty strand.
+        """
+        self.rates = []
+        self.a_init = self.alpha
+
+    def get_R(self):
+        """
+            Calculates R - the sum of all possible
+            transitions.
+        """
+        return self.a_init + sum(self.rates)
+
+    def get_transition(self, R):
+        """
+            Finds the site of the ribosome which hops
+            (0 for initiation).
+        """
+        r = self.rng.uniform(0, 1) * R
+        total = self.a_init
+        if total >= r:
+            return 0
+        for k, rate in enumerate(self.rates):
+            total += rate
+            if total >= r:
+                return self.positions[k]
+        # Rounding, pick the last possible hop.
+        for k in range(len(self.rates) - 1, -1, -1):
+            if self.rates[k] > 0:
+                return self.positions[k]
+        return 0
+
+    def hop_rate(self, k):
+        """
+            Rate of the ribosome at positions[k], which is blocked
+            if the next ribosome sits exactly length sites ahead.
+        """
+        site = self.positions[k]
+        if k + 1 < len(self.positions) and \
+                self.positions[k + 1] == site + self.length:
+            return 0.0
+        return float(self.omegas[site])
+
+    def update(self, index):
+        """
+            Update method to realise the transition
+            chosen by the Gillespie Algorithm
+        """
+        # Initiation.
+        if index == 0:
+            self.positions.insert(0, 1)
+            self.rates.insert(0, 0.0)
+            self.rates[0] = self.hop_rate(0)
+            self.n_ribosomes += 1
+        else:
+            k = bisect_left(self.positions, index)
+            # Detaching from lattice.
+            if index == self.size - 1:
+                self.positions.pop(k)
+                self.rates.pop(k)
+                self.n_ribosomes -= 1
+            # Elongation.
+            else:
+                self.positions[k] = index + 1
+                self.rates[k] = self.hop_rate(k)
+            # Potential unblocking of the ribosome behind.
+            if k > 0:
+                self.rates[k - 1] = self.hop_rate(k - 1)
+        # Initiation needs the first length sites free.
+        if not self.positions or self.positions[0] > self.length:
+            self.a_init = self.alpha
+        else:
+            self.a_init = 0.0
+
+    def count_ribosomes(self):
+        """
+            The ribosome count is always up to date.
+        """
+        self.n_ribosomes = len(self.positions)
+
+    def get_positions(self):
+        """
+            Iterates over the occupied sites in increasing order.
+        """
+        return iter(self.positions)
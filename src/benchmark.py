@@ -0,0 +1,187 @@
+"""
+    ================================================================
+    A python script to benchmark the simulation engines. It times
+    the get_R, get_transition and update operations of
+    ProteinSynthesis, full early time trajectories of every engine
+    for a short, a medium, a long and a human gene, and early time
+    ensembles at several worker counts. Seeds and the initiation
+    rate are fixed so runs on the same machine are comparable, and
+    results are written to JSON.
+
+    Usage: python benchmark.py [--rates rates/rates] [--quick]
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from ProteinSynthesis import ProteinSynthesis
+import early_time
+import ensemble
+import tasep_kernel
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+import numpy as np
+
+# Benchmark genes, relative to the rates directory.
+GENES = {"short": "E_coli/growth-rate-1_6/xseB",
+         "medium": "E_coli/growth-rate-1_6/pdxB",
+         "long": "E_coli/growth-rate-1_6/fimD",
+         "human": "H_sapiens/beta-actin"}
+# Fixed initiation rate, not every benchmark gene is in the workbook.
+ALPHA = 0.1
+# Ribosome length and number of measurements of early_time.
+LENGTH = 10
+N_MEAS = 100
+
+
+def best_of(repeat, function, *args):
+    """
+        Smallest wall time of repeat calls of function.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def warmed_up(omegas, seed):
+    """
+        A simulation run for a while from an empty lattice, so
+        the operations are timed with ribosomes on the mRNA.
+    """
+    simulation = ProteinSynthesis(length=LENGTH, size=omegas.size,
+                                  alpha=ALPHA, omegas=omegas,
+                                  rng=random.Random(seed))
+    for _ in range(20 * omegas.size):
+        R = simulation.get_R()
+        simulation.update(simulation.get_transition(R))
+    return simulation
+
+
+def micro(omegas, n_events, seed):
+    """
+        Nanoseconds per call of get_R, get_transition and update,
+        and events per second of the full Gillespie step.
+    """
+    simulation = warmed_up(omegas, seed)
+    R = simulation.get_R()
+    start = time.perf_counter()
+    for _ in range(n_events):
+        simulation.get_R()
+    get_R = time.perf_counter() - start
+    start = time.perf_counter()
+    for _ in range(n_events):
+        simulation.get_transition(R)
+    get_transition = time.perf_counter() - start
+    # update changes the state, so it is timed inside a run of
+    # events with the cost of the clock calls subtracted.
+    clock = time.perf_counter()
+    for _ in range(n_events):
+        time.perf_counter()
+    clock = time.perf_counter() - clock
+    update = 0.0
+    start = time.perf_counter()
+    for _ in range(n_events):
+        R = simulation.get_R()
+        simulation.get_random_time(R)
+        index = simulation.get_transition(R)
+        before = time.perf_counter()
+        simulation.update(index)
+        update += time.perf_counter() - before
+    step = time.perf_counter() - start
+    return {"get_R_ns": 1e9 * get_R / n_events,
+            "get_transition_ns": 1e9 * get_transition / n_events,
+            "update_ns": 1e9 * max(update - clock, 0.0) / n_events,
+            "events_per_s": n_events / step,
+            "ribosomes": simulation.get_occupation_number()}
+
+
+def trajectories(engine, omegas, n_traj, seed, repeat):
+    """
+        Wall time of n_traj early time trajectories of an engine
+        up to the horizon used by early_time.
+    """
+    T = 1.5 * np.sum(np.reciprocal(omegas[1:]))
+    dt = T / N_MEAS
+    seconds = best_of(repeat, ensemble.run_chunk, engine, 0, n_traj,
+                      LENGTH, ALPHA, omegas, T, dt, N_MEAS, seed)
+    return {"engine": engine, "n_traj": n_traj, "seconds": seconds,
+            "trajectories_per_s": n_traj / seconds}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the mRNA translation engines.")
+    parser.add_argument("--rates", default="rates/rates",
+                        help="directory holding the benchmark genes")
+    parser.add_argument("--engines", default="python,sparse,batched",
+                        help="comma separated trajectory engines "
+                        "(compiled is added when numba is available)")
+    parser.add_argument("--workers", default="1,2,4",
+                        help="comma separated worker counts of the "
+                        "ensemble benchmark")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="timings keep the best of this many runs")
+    parser.add_argument("--quick", action="store_true",
+                        help="ten times fewer events and trajectories")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="results file")
+    args = parser.parse_args()
+
+    scale = 10 if args.quick else 1
+    engines = args.engines.split(",")
+    if tasep_kernel.HAVE_NUMBA and "compiled" not in engines:
+        engines.append("compiled")
+    omegas = {size: early_time.load_omegas(
+        os.path.join(args.rates, gene + "_rates.dat"), ALPHA)
+        for size, gene in GENES.items()}
+
+    results = {"machine": {"python": sys.version.split()[0],
+                           "numpy": np.__version__,
+                           "platform": platform.platform(),
+                           "cpus": os.cpu_count(),
+                           "numba": tasep_kernel.HAVE_NUMBA},
+               "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+               "seed": args.seed, "alpha": ALPHA, "length": LENGTH,
+               "micro": [], "trajectories": [], "ensemble": []}
+
+    for size, gene in GENES.items():
+        row = {"gene": gene, "size": size, "L": int(omegas[size].size)}
+        row.update(micro(omegas[size], 100000 // scale, args.seed))
+        results["micro"].append(row)
+        print(row)
+    for size, gene in GENES.items():
+        for engine in engines:
+            # The batched engine needs a batch to be worth running.
+            n_traj = (1000 if engine == "batched" else 100) // scale
+            row = {"gene": gene, "size": size}
+            row.update(trajectories(engine, omegas[size], n_traj,
+                                    args.seed, args.repeat))
+            results["trajectories"].append(row)
+            print(row)
+    medium = omegas["medium"]
+    for workers in [int(value) for value in args.workers.split(",")]:
+        start = time.perf_counter()
+        early_time.simulate(medium, ALPHA, LENGTH, 2000 // scale, N_MEAS,
+                            "python", args.seed, workers=workers)
+        seconds = time.perf_counter() - start
+        row = {"gene": GENES["medium"], "engine": "python",
+               "n_traj": 2000 // scale, "workers": workers,
+               "seconds": seconds}
+        results["ensemble"].append(row)
+        print(row)
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,41 +9,36 @@
     ================================================================
 """
 from ProteinSynthesis import ProteinSynthesis
-import sys
+import ensemble
+import mean_field
+from initiation_rates import load_initiation_rates
+from Profiler import Profiler, phase
+from ResultCache import ResultCache
+import argparse
+import os
+import time
 import numpy as np
-import matplotlib.pyplot as plt
-import openpyxl
 
+# Attempts at merging an --h5 shard while other runs hold the store.
+MERGE_ATTEMPTS = 5
 
-def main():
-    # Taking in arguments.
-    if len(sys.argv) != 3:
-        print("Wrong number of arguments.")
-        print("Usage: " + sys.argv[0] +
-              " <parameters file>" + "<translation rates>")
-        quit()
-    else:
-        simul_parameters = sys.argv[1]
-        trans_params = sys.argv[2]
-
-    # Loading Excel spreadsheet.
-    wb = openpyxl.load_workbook("Initiation-Rates.xlsx")
-    # Choosing appropriate sheet.
-    ws = wb['LacZ']
-    # Storing genes and alphas.
-    alphas = []
-    genes = []
-    # Get alphas.
-    for column in ws['B2':'B786']:
-        for cell in column:
-            alphas.append(cell.value)
-    # Get gene names.
-    for column in ws['A2':'A786']:
-        for cell in column:
-            genes.append(cell.value)
-    # Creating dictionary to hold alphas.
-    alpha_dict = dict(zip(genes, alphas))
 
+def gene_name(trans_params):
+    """
+        Gets the gene name from a translation rates file name,
+        e.g. growth_rate1_6/leuL_rates.dat -> leuL.
+    """
+    name = os.path.basename(str(trans_params))
+    if name.endswith("_rates.dat"):
+        name = name[:-len("_rates.dat")]
+    return name
+
+
+def read_parameters(simul_parameters):
+    """
+        Reads ribosome length, number of trajectories and
+        number of measurements from the parameters file.
+    """
     # Open input file and assinging parameters.
     with open(str(simul_parameters), "r") as f:
         # Read the lines of the input data file.
@@ -52,17 +47,45 @@ def main():
         l = int(items[0])        # Ribosome length.
         n_traj = int(items[1])   # Number of trajectories.
         n_meas = int(items[2])   # Number of measurements.
-    alpha = alpha_dict[str(trans_params[15:19])]
+    return l, n_traj, n_meas
 
-    # Initialising elongation rates.
+
+def load_omegas(trans_params, alpha):
+    """
+        Reads the elongation rates of a gene and prepends
+        the initiation rate.
+    """
     with open(str(trans_params), "r") as f:
         elong_omegas = np.array([float(line.split()[1]) for line in f])
     omegas = np.zeros(elong_omegas.size + 1)
     omegas[1:] = elong_omegas  # Adding elongation rates.
     omegas[0] = alpha
-    print(np.mean(omegas))          # Initiation rate.
-    L = int(omegas.size)       # Setting length of mRNA.
+    return omegas
 
+
+def simulate(omegas, alpha, l, n_traj, n_meas, engine, seed, workers=1,
+             batch_size=1024, rse=None, min_traj=0, first_passage=False,
+             checkpoint=None, checkpoint_every=10.0, cache=None):
+    """
+        Runs the early time ensemble of a gene up to 1.5 times
+        its analytical T1. With rse the ensemble stops early once
+        the relative standard errors reach rse, running between
+        min_traj and n_traj trajectories. With first_passage only
+        the tagged ribosome statistics are produced, sampled
+        analytically whatever the engine, and the measurement
+        times and density are None. A fixed size
+        ensemble is checkpointed to and resumed from checkpoint
+        (see ensemble.run_ensemble) and, with a ResultCache,
+        read from the cache or topped up from a smaller cached
+        ensemble. Returns a dictionary
+        holding the measurement times, the density, the mean T1
+        (T1_exp), the analytical T1 (T1_ana), the mean initiation
+        time (lambda), the raw per-trajectory times and the
+        number of trajectories run.
+    """
+    if first_passage and rse is not None:
+        raise ValueError("first_passage runs a fixed number of trajectories")
+    L = int(omegas.size)
     # Time taken for first ribosome to complete translation.
     exact_t1 = np.sum(np.reciprocal(omegas[1:]))
     # Upper time limit for simulation.
@@ -71,79 +94,196 @@ def main():
     # Setting time domains for observables.
     dt = T / n_meas
     measure_times = np.arange(0, T, dt)
-    # Density data storage.
-    densities = np.zeros(measure_times.size)
-    # Tagged ribosome times to complete synthesis of first peptide.
-    tagged_times = []
-    initiation_times = []
 
-    # Simulations begin.
-    for i in range(n_traj):
-        print(i)
-        # Density data storage.
-        traj_densities = np.zeros(measure_times.size)
-        # Tracking first ribosome.
-        ribosome_pos = 1
-        check = False
-        # Time initiation.
-        t_old = 0
-        t_new = 0
-        # Tick finding.
-        k1 = 0
-        k2 = 0
-        # Create new instance of the simulation for every trajectory.
-        simulation = ProteinSynthesis(
-            length=l, size=L, alpha=alpha, omegas=omegas)
-        # Begin trajectory.
-        while t_new <= T:
-            k1 = simulation.get_k1(t_old, dt)  # Get k1.
-            # Collect all possible moves.
-            R = simulation.get_R()
-            # Sample random time.
-            t_new += simulation.get_random_time(R)
-            k2 = simulation.get_k2(t_new, dt)  # Get k2.
-            # Final loop check.
-            if t_new > T:
-                k2 = n_meas
-            # Setting values.
-            traj_densities[k1:k2 + 1] = simulation.get_occupation_number()
-            # Update t_old
-            t_old = t_new
-            # Choose which ribosome moves.
-            index = simulation.get_transition(R)
-            # Update simulation - ribosome hops.
-            simulation.update(index)
-            # Tracking initial ribosome position.
-            if check == False:
-                if (index + 1) == ribosome_pos:
-                    ribosome_pos += 1
-                    # Ignore initiation time.
-                    if ribosome_pos == 2:
-                        initiation_time = t_new
-                        initiation_times.append(initiation_time)
-                    # Store <T1>
-                    if ribosome_pos > (simulation.size - 1):
-                        tagged_times.append(t_new - initiation_time)
-                        check = True
-
-        # Collect data for each trajectory.
-        densities += traj_densities
+    if first_passage:
+        initiation_times, tagged_times = ensemble.run_first_passage(
+            n_traj, alpha, omegas, seed, workers=workers,
+            batch_size=batch_size)
+        measure_times = None
+        densities = None
+    elif rse is None:
+        prefix = None
+        if cache is not None:
+            key = cache.key(engine, l, alpha, omegas, T, n_meas, seed,
+                            batch_size)
+            prefix = cache.get(key)
+            # A larger ensemble cannot be cut down, run afresh.
+            if prefix is not None and prefix[0] > n_traj:
+                prefix = None
+        densities, initiation_times, tagged_times = ensemble.run_ensemble(
+            engine, n_traj, l, alpha, omegas, T, dt, n_meas, seed,
+            workers=workers, batch_size=batch_size, checkpoint=checkpoint,
+            checkpoint_every=checkpoint_every, prefix=prefix)
+        if cache is not None:
+            cache.put(key, n_traj, densities, initiation_times, tagged_times)
+    else:
+        densities, initiation_times, tagged_times, n_traj = \
+            ensemble.run_adaptive(
+                engine, l, alpha, omegas, T, dt, n_meas, seed, rse,
+                min_traj, n_traj, workers=workers, block=batch_size)
     # Compute actual density.
-    densities = densities / (n_traj * (L - 1))
-    # Calculating mean initiation time.
-    initiation_time = np.mean(initiation_times)
+    if densities is not None:
+        densities = densities[:measure_times.size] / (n_traj * (L - 1))
+    return {"measure_times": measure_times, "densities": densities,
+            "T1_exp": np.mean(tagged_times), "T1_ana": exact_t1,
+            "lambda": np.mean(initiation_times),
+            "tagged_times": tagged_times,
+            "initiation_times": initiation_times, "n_traj": n_traj}
+
+
+def main():
+    # Taking in arguments.
+    parser = argparse.ArgumentParser(
+        description="Early time behaviour of mRNA translation.")
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("rates", help="translation rates file")
+    parser.add_argument("--alphas", default="Initiation-Rates.xlsx",
+                        help="initiation rates workbook")
+    parser.add_argument("--sheet", default="LacZ",
+                        help="sheet of the initiation rates workbook")
+    parser.add_argument("--column", default="B",
+                        help="column of the initiation rates")
+    parser.add_argument("--engine", choices=ensemble.ENGINE_NAMES,
+                        default=None, help="trajectory engine (default "
+                        "python)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="ensemble seed (random when omitted)")
+    parser.add_argument("--batch-size", type=int, default=1024,
+                        help="trajectories per batch of the batched engine "
+                        "and per block of the adaptive mode")
+    parser.add_argument("--rse", type=float, default=None,
+                        help="stop once T1, initiation time and density "
+                        "reach this relative standard error")
+    parser.add_argument("--min-traj", type=int, default=0,
+                        help="minimum number of trajectories with --rse")
+    parser.add_argument("--first-passage", action="store_true",
+                        help="only measure the tagged ribosome, no density")
+    parser.add_argument("--mean-field", action="store_true",
+                        help="also save the mean-field density dynamics")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file, resumed from when it exists")
+    parser.add_argument("--checkpoint-every", type=float, default=10.0,
+                        help="seconds between checkpoints")
+    parser.add_argument("--profile", default=None,
+                        help="write phase timings and event counts (in "
+                        "process python and sparse trajectories) to this "
+                        "JSON file")
+    parser.add_argument("--cache", default=None,
+                        help="directory of the result cache of fixed size "
+                        "density ensembles")
+    parser.add_argument("--cache-size", type=float, default=1024,
+                        help="size limit of the result cache in MB")
+    parser.add_argument("--h5", default=None,
+                        help="append the results to this HDF5 DensityStore "
+                        "instead of writing <gene>_density_data.dat")
+    parser.add_argument("--no-plot", action="store_true",
+                        help="only save the data, plot later with render.py")
+    parser.add_argument("--show", action="store_true",
+                        help="show the plot as well as saving it")
+    args = parser.parse_args()
+    if args.first_passage and (args.engine is not None or
+                               args.rse is not None or args.min_traj):
+        parser.error("--first-passage samples the tagged ribosome "
+                     "analytically and takes no --engine, --rse or --min-traj")
+    if args.engine is None:
+        args.engine = "python"
+    if args.cache is not None and (args.rse is not None or
+                                   args.first_passage):
+        parser.error("--cache keeps fixed size density ensembles and "
+                     "takes no --rse or --first-passage")
+    if args.checkpoint is not None and (args.rse is not None or
+                                        args.first_passage):
+        parser.error("--checkpoint needs a fixed size density ensemble")
+    if args.checkpoint is not None and args.seed is None:
+        parser.error("--checkpoint needs --seed to resume")
+    simul_parameters = args.parameters
+    trans_params = args.rates
+    seed = args.seed
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+    print(seed)
+    profiler = None if args.profile is None else Profiler()
+    ensemble.PROFILER = profiler
+    cache = None if args.cache is None else \
+        ResultCache(args.cache, int(args.cache_size * 2**20))
+
+    with phase(profiler, "read_alphas"):
+        alpha_dict = load_initiation_rates(args.alphas, args.sheet,
+                                           args.column)
+    l, n_traj, n_meas = read_parameters(simul_parameters)
+    gene = gene_name(trans_params)
+    alpha = alpha_dict[gene]
+
+    # Initialising elongation rates.
+    with phase(profiler, "read_rates"):
+        omegas = load_omegas(trans_params, alpha)
+    print(np.mean(omegas))          # Initiation rate.
+    L = int(omegas.size)       # Setting length of mRNA.
+
+    # Simulations begin.
+    with phase(profiler, "simulate"):
+        result = simulate(omegas, alpha, l, n_traj, n_meas, args.engine,
+                          seed, workers=args.workers,
+                          batch_size=args.batch_size, rse=args.rse,
+                          min_traj=args.min_traj,
+                          first_passage=args.first_passage,
+                          checkpoint=args.checkpoint,
+                          checkpoint_every=args.checkpoint_every,
+                          cache=cache)
+    measure_times = result["measure_times"]
+    densities = result["densities"]
+    exact_t1 = result["T1_ana"]
+    avg_t1 = result["T1_exp"]
+    initiation_time = result["lambda"]
+    print(result["n_traj"])
 
     # Comparing analytical and experimental results
-    avg_t1 = np.mean(np.array(tagged_times))
     print(avg_t1)
     print(exact_t1)
     print(initiation_time)
 
-    # Plotting.
-    simulation.plot_density(measure_times, densities,
-                            avg_t1, str(trans_params[15:19]))
-    # Saving data.
-    simulation.save_data(measure_times, densities, str(trans_params[15:19]))
+    if not args.first_passage:
+        # Plotting.
+        simulation = ProteinSynthesis(length=l, size=L, alpha=alpha,
+                                      omegas=omegas)
+        if not args.no_plot:
+            with phase(profiler, "plot"):
+                simulation.plot_density(measure_times, densities,
+                                        avg_t1, gene, args.show)
+        # Saving data.
+        with phase(profiler, "save"):
+            if args.h5 is None:
+                simulation.save_data(measure_times, densities, gene)
+            else:
+                from DensityStore import DensityStore, merge, shard_path
+                # Concurrent runs share the store, write a shard first.
+                shard = shard_path(args.h5)
+                DensityStore(shard).append([{
+                    "Gene": gene, "rates": trans_params,
+                    "measure_times": measure_times,
+                    "densities": densities, "T1_exp": avg_t1,
+                    "T1_ana": exact_t1, "lambda": initiation_time,
+                    "alpha": alpha, "n_traj": result["n_traj"]}])
+                for attempt in range(MERGE_ATTEMPTS):
+                    try:
+                        merge(args.h5, [shard])
+                        break
+                    except OSError:
+                        # Another run holds the store, wait and retry.
+                        time.sleep(0.5 * (attempt + 1))
+                else:
+                    print(args.h5 + " is in use, results left in " + shard +
+                          " for DensityStore.py merge")
+        if args.mean_field:
+            with phase(profiler, "mean_field"):
+                mf_densities, _ = mean_field.density_dynamics(
+                    alpha, omegas, l, measure_times)
+            simulation.save_data(measure_times, mf_densities, gene + "_mf")
+    if profiler is not None:
+        profiler.write(args.profile)
 
 
-main()
+if __name__ == "__main__":
+    main()
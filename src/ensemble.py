@@ -0,0 +1,465 @@
+"""
+    ================================================================
+    Runs ensembles of independent early time trajectories of mRNA
+    translation, optionally spread across worker processes. Every
+    trajectory draws from its own random stream derived from the
+    ensemble seed and its index, so results do not depend on the
+    number of workers.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from ProteinSynthesis import ProteinSynthesis
+from BatchedProteinSynthesis import BatchedProteinSynthesis
+from SparseProteinSynthesis import SparseProteinSynthesis
+from RunningStats import RunningStats
+from Profiler import phase
+import os
+import random
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+# Version of the trajectory engines, to be increased whenever a
+# change alters the results they produce for a given seed.
+VERSION = 1
+
+# Profiler counting the events and timing the binning of in-process
+# python and sparse trajectories, set by the drivers when profiling.
+PROFILER = None
+
+
+def trajectory_seed(seed, i):
+    """
+        Derives the seed of trajectory i from the ensemble seed.
+    """
+    return int(np.random.SeedSequence([seed, i]).generate_state(1)[0])
+
+
+def python_trajectory(l, alpha, omegas, T, dt, n_meas, seed,
+                      model=ProteinSynthesis):
+    """
+        Runs one early time trajectory with ProteinSynthesis, or
+        another model sharing its interface. Returns the
+        occupation number on the measurement grid, the tagged
+        ribosome initiation time and its T1 (NaN when not reached
+        before the horizon).
+    """
+    L = int(omegas.size)
+    initiation_time = np.nan
+    t1 = np.nan
+    # Tracking first ribosome.
+    ribosome_pos = 1
+    check = False
+    # Time initiation.
+    t_new = 0
+    # Create new instance of the simulation for every trajectory.
+    simulation = model(
+        length=l, size=L, alpha=alpha, omegas=omegas,
+        rng=random.Random(seed))
+    if PROFILER is not None:
+        PROFILER.count_events(simulation)
+    simulation.start_recording()
+    # Begin trajectory.
+    while t_new <= T:
+        # Collect all possible moves.
+        R = simulation.get_R()
+        # Sample random time.
+        t_new += simulation.get_random_time(R)
+        # Choose which ribosome moves.
+        index = simulation.get_transition(R)
+        simulation.record(index, t_new)
+        # Update simulation - ribosome hops.
+        simulation.update(index)
+        # Tracking initial ribosome position.
+        if check == False:
+            if (index + 1) == ribosome_pos:
+                ribosome_pos += 1
+                # Ignore initiation time.
+                if ribosome_pos == 2:
+                    initiation_time = t_new
+                # Store <T1>
+                if ribosome_pos > (simulation.size - 1):
+                    t1 = t_new - initiation_time
+                    check = True
+    # Occupation number on the measurement grid.
+    with phase(PROFILER, "binning"):
+        traj_densities = simulation.get_recorded_occupation(
+            np.arange(n_meas + 1) * dt)
+    return traj_densities, initiation_time, t1
+
+
+def sparse_trajectory(l, alpha, omegas, T, dt, n_meas, seed):
+    """
+        Runs one early time trajectory with the particle based
+        SparseProteinSynthesis.
+    """
+    return python_trajectory(l, alpha, omegas, T, dt, n_meas, seed,
+                             model=SparseProteinSynthesis)
+
+
+def compiled_trajectory(l, alpha, omegas, T, dt, n_meas, seed):
+    """
+        Runs one early time trajectory with the compiled kernel.
+    """
+    # Imported here as numba is slow to import.
+    import tasep_kernel
+    tasep_kernel.seed(seed)
+    return tasep_kernel.run_trajectory(
+        omegas, float(alpha), int(l), T, dt, int(n_meas))
+
+
+def batched_chunk(start, stop, l, alpha, omegas, T, dt, n_meas, seed,
+                  stats=False):
+    """
+        Runs trajectories start to stop - 1 as one vectorised batch.
+        The batch draws from a single stream seeded by its first
+        trajectory index. With stats the summed densities are
+        replaced by their RunningStats.
+    """
+    batch = BatchedProteinSynthesis(
+        length=l, size=omegas.size, alpha=alpha, omegas=omegas,
+        n_traj=stop - start,
+        rng=np.random.default_rng(trajectory_seed(seed, start)))
+    densities, initiation_times, tagged_times = batch.run(T, dt, n_meas)
+    if stats:
+        densities = RunningStats.from_sums(
+            stop - start, densities, batch.square_densities)
+    return densities, initiation_times, tagged_times
+
+
+ENGINES = {"python": python_trajectory, "sparse": sparse_trajectory,
+           "compiled": compiled_trajectory}
+ENGINE_NAMES = sorted(ENGINES) + ["batched"]
+
+
+def run_chunk(engine, start, stop, l, alpha, omegas, T, dt, n_meas, seed,
+              stats=False):
+    """
+        Runs trajectories start to stop - 1. Returns the partial
+        sum of the occupation numbers (or their RunningStats with
+        stats) together with the initiation times and T1s of every
+        trajectory in order.
+    """
+    if engine == "batched":
+        return batched_chunk(start, stop, l, alpha, omegas, T, dt,
+                             n_meas, seed, stats)
+    trajectory = ENGINES[engine]
+    densities = RunningStats() if stats else np.zeros(n_meas + 1)
+    initiation_times = np.full(stop - start, np.nan)
+    tagged_times = np.full(stop - start, np.nan)
+    for i in range(start, stop):
+        traj_densities, initiation_time, t1 = trajectory(
+            l, alpha, omegas, T, dt, n_meas, trajectory_seed(seed, i))
+        if stats:
+            densities.push(traj_densities)
+        else:
+            densities += traj_densities
+        initiation_times[i - start] = initiation_time
+        tagged_times[i - start] = t1
+    return densities, initiation_times, tagged_times
+
+
+def ensemble_key(engine, l, alpha, omegas, T, n_meas, seed, batch_size):
+    """
+        String identifying the trajectories of an ensemble, i.e.
+        everything but their number that determines the results.
+        The batch size only matters to the batched engine, and site
+        0 of omegas, which the engines never read, is left out.
+    """
+    return repr((VERSION, engine, str(seed), int(l), float(alpha),
+                 float(T), int(n_meas), float(np.sum(omegas[1:])),
+                 int(batch_size) if engine == "batched" else None))
+
+
+def save_progress(path, key, done, densities, initiation_times,
+                  tagged_times):
+    """
+        Checkpoints the results of the first done trajectories of
+        an ensemble identified by key. The file is written under a
+        temporary name and moved into place.
+    """
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, key=key, done=done, densities=densities,
+             initiation_times=initiation_times, tagged_times=tagged_times)
+    os.replace(tmp, path)
+
+
+def load_progress(path, key):
+    """
+        Reads a checkpoint written by save_progress. Returns None
+        when there is none and raises ValueError when it belongs
+        to a different ensemble.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as checkpoint:
+        if str(checkpoint["key"]) != key:
+            raise ValueError("checkpoint " + path +
+                             " belongs to a different ensemble")
+        return (int(checkpoint["done"]), checkpoint["densities"],
+                checkpoint["initiation_times"], checkpoint["tagged_times"])
+
+
+def run_ensemble(engine, n_traj, l, alpha, omegas, T, dt, n_meas, seed,
+                 workers=1, batch_size=1024, checkpoint=None,
+                 checkpoint_every=10.0, prefix=None):
+    """
+        Runs n_traj trajectories split into chunks over a pool of
+        worker processes and merges the partial results in
+        trajectory order. Occupation numbers are integers, so the
+        summed densities are exact and, together with the ordered
+        merge of the times, bit-identical for any worker count.
+        The batched engine always uses chunks of batch_size
+        trajectories for the same reason.
+        With checkpoint, the merged results are saved there at
+        most every checkpoint_every seconds (chunks are then at
+        most batch_size trajectories) and a run finding the file
+        resumes after the trajectories it holds, with the same
+        results as an uninterrupted run. Likewise prefix, a tuple
+        of the number of trajectories done, their summed densities,
+        initiation times and T1s, e.g. from a ResultCache, is
+        topped up rather than recomputed. A batch draws from one
+        stream seeded by where it starts, so with the batched
+        engine a prefix not ending on a multiple of batch_size
+        could not be topped up to a fresh run's results and is
+        ignored unless it already holds n_traj trajectories.
+        Returns the summed densities and the initiation times and
+        T1s of the trajectories in which they were reached.
+    """
+    densities = np.zeros(n_meas + 1)
+    initiation_times = [np.zeros(0)]
+    tagged_times = [np.zeros(0)]
+    done = 0
+    progress = prefix
+    if engine == "batched" and prefix is not None and \
+            prefix[0] % batch_size != 0 and prefix[0] != n_traj:
+        progress = None
+    if checkpoint is not None:
+        key = ensemble_key(engine, l, alpha, omegas, T, n_meas, seed,
+                           batch_size) + " " + str(int(n_traj))
+        progress = load_progress(checkpoint, key) or progress
+    if progress is not None:
+        done, densities, initiations, tagged = progress
+        densities = np.array(densities, dtype=float)
+        initiation_times.append(initiations)
+        tagged_times.append(tagged)
+
+    if engine == "batched":
+        bounds = np.append(np.arange(done, n_traj, batch_size), n_traj)
+    else:
+        n_chunks = max(1, min(n_traj - done, 4 * workers))
+        if checkpoint is not None:
+            n_chunks = max(n_chunks, -(-(n_traj - done) // batch_size))
+        bounds = np.linspace(done, n_traj, n_chunks + 1).astype(int)
+    n_chunks = bounds.size - 1
+    chunks = [(engine, bounds[k], bounds[k + 1], l, alpha, omegas,
+               T, dt, n_meas, seed) for k in range(n_chunks)
+              if bounds[k] < bounds[k + 1]]
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        if pool is not None:
+            futures = [pool.submit(run_chunk, *chunk) for chunk in chunks]
+            results = (future.result() for future in futures)
+        else:
+            results = (run_chunk(*chunk) for chunk in chunks)
+
+        # Merging partial results in order.
+        last_save = time.monotonic()
+        for chunk, (partial, initiations, tagged) in zip(chunks, results):
+            densities += partial
+            initiation_times.append(initiations)
+            tagged_times.append(tagged)
+            done = chunk[2]
+            if checkpoint is not None and (done == n_traj or
+                    time.monotonic() - last_save >= checkpoint_every):
+                initiation_times = [np.concatenate(initiation_times)]
+                tagged_times = [np.concatenate(tagged_times)]
+                save_progress(checkpoint, key, done, densities,
+                              initiation_times[0], tagged_times[0])
+                last_save = time.monotonic()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    initiation_times = np.concatenate(initiation_times)
+    tagged_times = np.concatenate(tagged_times)
+    return (densities, initiation_times[~np.isnan(initiation_times)],
+            tagged_times[~np.isnan(tagged_times)])
+
+
+def run_adaptive(engine, l, alpha, omegas, T, dt, n_meas, seed, rse,
+                 min_traj, max_traj, workers=1, block=256):
+    """
+        Runs trajectories in rounds of workers blocks until the
+        relative standard error of T1, of the initiation time and
+        of the density series are all below rse, or max_traj is
+        reached. At least min_traj trajectories are run. Blocks
+        are fixed in size, merged in order and tested one by one,
+        so the stopping point and results do not depend on the
+        worker count.
+        Returns the summed densities, the initiation times and
+        T1s reached, and the number of trajectories run.
+    """
+    densities = RunningStats()
+    initiation_stats = RunningStats()
+    tagged_stats = RunningStats()
+    initiation_times = []
+    tagged_times = []
+    n_traj = 0
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        while n_traj < max_traj:
+            starts = np.arange(n_traj, max_traj, block)[:workers]
+            stops = np.minimum(starts + block, max_traj)
+            chunks = [(engine, starts[k], stops[k], l, alpha, omegas,
+                       T, dt, n_meas, seed, True)
+                      for k in range(starts.size)]
+            if pool is not None:
+                futures = [pool.submit(run_chunk, *chunk) for chunk in chunks]
+                results = [future.result() for future in futures]
+            else:
+                results = [run_chunk(*chunk) for chunk in chunks]
+
+            # Merging partial results in order, convergence is
+            # checked after every block and later blocks of the
+            # round are discarded once it is reached.
+            converged = False
+            for k, (partial, initiations, tagged) in enumerate(results):
+                densities.merge(partial)
+                initiations = initiations[~np.isnan(initiations)]
+                tagged = tagged[~np.isnan(tagged)]
+                initiation_stats.extend(initiations)
+                tagged_stats.extend(tagged)
+                initiation_times.append(initiations)
+                tagged_times.append(tagged)
+                n_traj = int(stops[k])
+                converged = n_traj >= min_traj and \
+                    tagged_stats.rse() <= rse and \
+                    initiation_stats.rse() <= rse and densities.rse() <= rse
+                if converged:
+                    break
+            if converged:
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return (densities.mean * n_traj, np.concatenate(initiation_times),
+            np.concatenate(tagged_times), n_traj)
+
+
+def first_passage_chunk(start, stop, alpha, omegas, seed):
+    """
+        Samples the initiation time and T1 of trajectories start to
+        stop - 1 without simulating the rest of the lattice. The
+        tagged ribosome is the first to initiate, so no ribosome is
+        ever ahead of it and the ribosomes behind can never block
+        it: the part of the lattice that still matters is the
+        tagged ribosome alone. Its initiation on the empty lattice
+        takes Exp(alpha) and it then makes one hop from each of the
+        sites 1 to L - 2, the last of which brings it to site L - 1
+        where T1 is recorded, exactly as in python_trajectory.
+    """
+    rng = np.random.default_rng(trajectory_seed(seed, start))
+    n = stop - start
+    initiation_times = rng.standard_exponential(n) / alpha
+    hops = omegas[1:omegas.size - 1]
+    tagged_times = np.sum(rng.standard_exponential((n, hops.size)) / hops,
+                          axis=1)
+    return initiation_times, tagged_times
+
+
+def run_first_passage(n_traj, alpha, omegas, seed, workers=1,
+                      batch_size=1024):
+    """
+        First passage only mode: returns the initiation times and
+        T1s of n_traj tagged ribosomes. No density series is built
+        and there is no horizon, every trajectory ends when its
+        tagged ribosome terminates.
+    """
+    bounds = np.append(np.arange(0, n_traj, batch_size), n_traj)
+    chunks = [(bounds[k], bounds[k + 1], alpha, omegas, seed)
+              for k in range(bounds.size - 1)]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(first_passage_chunk, *chunk)
+                       for chunk in chunks]
+            results = [future.result() for future in futures]
+    else:
+        results = [first_passage_chunk(*chunk) for chunk in chunks]
+    return (np.concatenate([r[0] for r in results]),
+            np.concatenate([r[1] for r in results]))
+
+
+def event_trajectory(l, alpha, omegas, T, seed, model=ProteinSynthesis):
+    """
+        Runs one trajectory up to T, the same one python_trajectory
+        runs for seed, and returns the initiation, arrival at the
+        last site and completion times of its ribosomes (see
+        get_recorded_ribosomes). As in python_trajectory, the event
+        taking the clock past T is included, so the first ribosome
+        gives the same initiation time and T1.
+    """
+    simulation = model(
+        length=l, size=int(omegas.size), alpha=alpha, omegas=omegas,
+        rng=random.Random(seed))
+    simulation.start_recording()
+    t_new = 0
+    while t_new <= T:
+        R = simulation.get_R()
+        t_new += simulation.get_random_time(R)
+        index = simulation.get_transition(R)
+        simulation.record(index, t_new)
+        simulation.update(index)
+    return simulation.get_recorded_ribosomes()
+
+
+EVENT_MODELS = {"python": ProteinSynthesis, "sparse": SparseProteinSynthesis}
+
+
+def events_chunk(engine, start, stop, l, alpha, omegas, T, seed):
+    """
+        Runs trajectories start to stop - 1 and returns their
+        ribosome initiation, arrival and completion times
+        concatenated, with the number of ribosomes of every
+        trajectory.
+    """
+    model = EVENT_MODELS[engine]
+    starts = []
+    arrivals = []
+    completions = []
+    counts = np.zeros(stop - start, dtype=int)
+    for i in range(start, stop):
+        s, a, c = event_trajectory(l, alpha, omegas, T,
+                                   trajectory_seed(seed, i), model)
+        starts.append(s)
+        arrivals.append(a)
+        completions.append(c)
+        counts[i - start] = s.size
+    return (np.concatenate(starts), np.concatenate(arrivals),
+            np.concatenate(completions), counts)
+
+
+def run_events(engine, n_traj, l, alpha, omegas, T, seed, workers=1):
+    """
+        Records the ribosome initiation, arrival and completion
+        times of n_traj trajectories, from which observables under
+        mRNA decay can be reweighted afterwards. Returns the times
+        concatenated in trajectory order and the offsets, of size
+        n_traj + 1, of every trajectory's ribosomes in them.
+    """
+    n_chunks = max(1, min(n_traj, 4 * workers))
+    bounds = np.linspace(0, n_traj, n_chunks + 1).astype(int)
+    chunks = [(engine, bounds[k], bounds[k + 1], l, alpha, omegas, T, seed)
+              for k in range(n_chunks) if bounds[k] < bounds[k + 1]]
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(events_chunk, *chunk) for chunk in chunks]
+            results = [future.result() for future in futures]
+    else:
+        results = [events_chunk(*chunk) for chunk in chunks]
+    counts = np.concatenate([r[3] for r in results])
+    offsets = np.concatenate(([0], np.cumsum(counts)))
+    return (np.concatenate([r[0] for r in results]),
+            np.concatenate([r[1] for r in results]),
+            np.concatenate([r[2] for r in results]), offsets)
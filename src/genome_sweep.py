@@ -0,0 +1,237 @@
+"""
+    ================================================================
+    A python script to run the early time analysis of mRNA
+    translation over whole sets of genes, e.g. every rates file
+    of an organism under rates/rates/. Results are collected in a
+    single table, one row per rates file. It holds no mRNA
+    half-lives, so it is not the overall_gene_dat.csv table read
+    by gene_plotter.py.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import early_time
+import ensemble
+from RateStore import RateStore
+from ResultCache import ResultCache
+from initiation_rates import load_initiation_rates
+import argparse
+import csv
+import glob
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+COLUMNS = ["Gene", "T1_exp", "T1_ana", "lambda", "CDS", "alpha", "n_traj",
+           "rates"]
+
+
+def find_rates(paths):
+    """
+        Expands directories and glob patterns into the list of
+        rates files they contain.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            pattern = os.path.join(path, "**", "*_rates.dat")
+            files.extend(glob.glob(pattern, recursive=True))
+        else:
+            files.extend(glob.glob(path))
+    return sorted(set(files))
+
+
+def check_header(outfile):
+    """
+        Raises ValueError when an existing results table was
+        written with columns other than COLUMNS, as appending to
+        it would misalign its rows.
+    """
+    if not os.path.exists(outfile) or os.path.getsize(outfile) == 0:
+        return
+    with open(outfile, "r", newline="") as f:
+        header = next(csv.reader(f), None)
+    if header != COLUMNS:
+        raise ValueError(outfile + " has columns " + str(header) +
+                         ", expected " + str(COLUMNS))
+
+
+def finished_genes(outfile):
+    """
+        Rates files already present in the results table.
+    """
+    if not os.path.exists(outfile):
+        return set()
+    with open(outfile, "r", newline="") as f:
+        return set(row["rates"] for row in csv.DictReader(f))
+
+
+def gene_seed(seed, trans_params):
+    """
+        Seed of a gene, independent of the order genes are run in.
+    """
+    return ensemble.trajectory_seed(seed, zlib.crc32(trans_params.encode()))
+
+
+# Rate stores opened by this process.
+STORES = {}
+
+
+def load_omegas(trans_params, alpha, store):
+    """
+        Rates of a gene, either parsed from its rates file or
+        sliced from a rate store when one is given.
+    """
+    if store is None:
+        return early_time.load_omegas(trans_params, alpha)
+    if store not in STORES:
+        STORES[store] = RateStore(store)
+    return STORES[store].omegas(trans_params)
+
+
+def run_gene(trans_params, alpha, l, n_traj, n_meas, engine, seed,
+             store=None, rse=None, min_traj=0, first_passage=False,
+             cache=None, h5=None):
+    """
+        Runs the early time ensemble of one gene and returns
+        its row of the results table. With h5 the density series
+        is appended to this process's shard of that DensityStore.
+    """
+    omegas = load_omegas(trans_params, alpha, store)
+    result = early_time.simulate(omegas, alpha, l, n_traj, n_meas, engine,
+                                 gene_seed(seed, trans_params), rse=rse,
+                                 min_traj=min_traj,
+                                 first_passage=first_passage, cache=cache)
+    row = {"Gene": early_time.gene_name(trans_params),
+           "T1_exp": result["T1_exp"], "T1_ana": result["T1_ana"],
+           "lambda": result["lambda"], "CDS": omegas.size - 1,
+           "alpha": alpha, "n_traj": result["n_traj"],
+           "rates": trans_params}
+    if h5 is not None and result["densities"] is not None:
+        from DensityStore import DensityStore, shard_path
+        DensityStore(shard_path(h5)).append([dict(
+            row, measure_times=result["measure_times"],
+            densities=result["densities"])])
+    return row
+
+
+def main():
+    # Taking in arguments.
+    parser = argparse.ArgumentParser(
+        description="Early time analysis over a set of genes.")
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("rates", nargs="+",
+                        help="rates directories, files or glob patterns "
+                        "(gene key patterns with --store)")
+    parser.add_argument("--store", default=None,
+                        help="rate store built by RateStore.py")
+    parser.add_argument("--alphas", default="Initiation-Rates.xlsx",
+                        help="initiation rates workbook")
+    parser.add_argument("--sheet", default="LacZ",
+                        help="sheet of the initiation rates workbook")
+    parser.add_argument("--column", default="B",
+                        help="column of the initiation rates")
+    parser.add_argument("--output", default="genome_sweep.csv",
+                        help="results table, genes already in it are skipped")
+    parser.add_argument("--engine", choices=ensemble.ENGINE_NAMES,
+                        default=None, help="trajectory engine (default "
+                        "python)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="sweep seed")
+    parser.add_argument("--rse", type=float, default=None,
+                        help="stop each gene once T1, initiation time and "
+                        "density reach this relative standard error")
+    parser.add_argument("--min-traj", type=int, default=0,
+                        help="minimum number of trajectories with --rse")
+    parser.add_argument("--first-passage", action="store_true",
+                        help="only measure the tagged ribosome")
+    parser.add_argument("--cache", default=None,
+                        help="directory of the result cache of fixed size "
+                        "density ensembles")
+    parser.add_argument("--cache-size", type=float, default=1024,
+                        help="size limit of the result cache in MB")
+    parser.add_argument("--h5", default=None,
+                        help="also collect the density series of every "
+                        "gene in this HDF5 DensityStore")
+    args = parser.parse_args()
+    if args.first_passage and (args.engine is not None or
+                               args.rse is not None or args.min_traj):
+        parser.error("--first-passage samples the tagged ribosome "
+                     "analytically and takes no --engine, --rse or --min-traj")
+    if args.engine is None:
+        args.engine = "python"
+    if args.cache is not None and (args.rse is not None or
+                                   args.first_passage):
+        parser.error("--cache keeps fixed size density ensembles and "
+                     "takes no --rse or --first-passage")
+    cache = None if args.cache is None else \
+        ResultCache(args.cache, int(args.cache_size * 2**20))
+
+    try:
+        check_header(args.output)
+    except ValueError as error:
+        parser.error(str(error))
+
+    l, n_traj, n_meas = early_time.read_parameters(args.parameters)
+    # Initiation rates are loaded once for the whole sweep.
+    alpha_dict = load_initiation_rates(args.alphas, args.sheet, args.column)
+
+    if args.store is None:
+        genes = find_rates(args.rates)
+        size = os.path.getsize
+    else:
+        store = RateStore(args.store)
+        genes = sorted(set(key for pattern in args.rates
+                           for key in store.keys(pattern)))
+        size = store.length
+
+    done = finished_genes(args.output)
+    todo = []
+    for trans_params in genes:
+        gene = early_time.gene_name(trans_params)
+        if trans_params in done:
+            continue
+        if alpha_dict.get(gene) is None:
+            print("No initiation rate for " + gene + ", skipping.")
+            continue
+        todo.append((trans_params, float(alpha_dict[gene])))
+    # Longest genes first, file size is proportional to length.
+    todo.sort(key=lambda job: size(job[0]), reverse=True)
+    print(str(len(done)) + " genes done, " + str(len(todo)) + " to run.")
+
+    new_file = not os.path.exists(args.output) or \
+        os.path.getsize(args.output) == 0
+    with open(args.output, "a", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        if new_file:
+            writer.writeheader()
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(run_gene, trans_params, alpha, l, n_traj,
+                                   n_meas, args.engine, args.seed, args.store,
+                                   args.rse, args.min_traj,
+                                   args.first_passage, cache, args.h5):
+                       trans_params for trans_params, alpha in todo}
+            # Rows are written as soon as a gene finishes so an
+            # interrupted sweep can be resumed.
+            for future in as_completed(futures):
+                try:
+                    row = future.result()
+                except ValueError as error:
+                    # e.g. selenoproteins with an in-frame STOP codon,
+                    # skipped like RateStore.build does.
+                    print("Unreadable rates in " + futures[future] +
+                          ", skipping: " + str(error))
+                    continue
+                writer.writerow(row)
+                f.flush()
+                print(row["Gene"])
+    if args.h5 is not None:
+        # Shards of interrupted sweeps are picked up as well.
+        from DensityStore import merge
+        merge(args.h5)
+
+
+if __name__ == "__main__":
+    main()
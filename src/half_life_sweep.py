@@ -0,0 +1,185 @@
+"""
+    ================================================================
+    A python script to study the early time translation of a gene
+    whose mRNA decays exponentially, for many half-lives at once.
+    An mRNA decaying at rate k = ln 2 / t_1/2 stops initiating, but
+    the ribosomes already on it are never held up by the ones
+    behind, so they move exactly as without decay. The ribosome
+    initiation, arrival and completion times of one ensemble are
+    therefore recorded once, and every observable under decay
+    follows by weighting each ribosome with the probability
+    exp(-k t_init) that the mRNA was still intact when it
+    initiated. The whole sweep costs one simulation and a
+    vectorised pass over the recorded times per half-life.
+
+    Usage: python half_life_sweep.py <parameters file> <rates file>
+           --half-lives 60,300,inf
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from initiation_rates import load_initiation_rates
+from phase_sweep import parse_grid
+import early_time
+import ensemble
+import argparse
+import csv
+import os
+import numpy as np
+
+COLUMNS = ["half_life", "k", "survival", "survival_ana", "lambda", "T1_exp",
+           "proteins"]
+
+
+def decay_rates(half_lives):
+    """
+        Decay rates of the half-lives, zero for an infinite one.
+    """
+    return np.log(2) / np.asarray(half_lives, dtype=np.float64)
+
+
+def cumulative(times, weights, grid):
+    """
+        Sum of the weights (one row per decay rate) of the events
+        occurring strictly before each grid time, as in
+        get_recorded_occupation.
+    """
+    order = np.argsort(times, kind="stable")
+    sums = np.zeros((weights.shape[0], times.size + 1))
+    np.cumsum(weights[:, order], axis=1, out=sums[:, 1:])
+    return sums[:, np.searchsorted(times[order], grid, side="left")]
+
+
+def reweight(starts, arrivals, completions, offsets, half_lives,
+             measure_times):
+    """
+        Observables of the recorded ensemble (see
+        ensemble.run_events) for every half-life. Returns a
+        dictionary holding the decay rates, the probability that
+        the tagged ribosome initiates before the mRNA decays
+        (survival, every trajectory starts with an initiation),
+        its mean initiation time (lambda) and T1 (to the last
+        site) given that it does,
+        and, on the measurement grid, the mean number of
+        ribosomes on the mRNA (occupation) and of proteins
+        completed (proteins), arrays of shape (half-lives,
+        times). With an infinite half-life lambda, T1 and the
+        occupation are those of ensemble.run_ensemble for the
+        same seed.
+    """
+    k = decay_rates(half_lives)
+    n_traj = offsets.size - 1
+    weights = np.exp(-np.outer(k, starts))
+    # Every ribosome is present in the decaying ensemble with the
+    # probability the mRNA survived to its initiation.
+    on = cumulative(starts, weights, measure_times)
+    off = cumulative(completions, weights, measure_times)
+
+    # Tagged ribosomes, the first of every trajectory.
+    first = offsets[:-1][np.diff(offsets) > 0]
+    tagged = weights[:, first]
+    t1 = arrivals[first] - starts[first]
+    done = np.isfinite(t1)
+    with np.errstate(invalid="ignore"):
+        initiation = tagged @ starts[first] / np.sum(tagged, axis=1)
+        t1 = tagged[:, done] @ t1[done] / np.sum(tagged[:, done], axis=1)
+    return {"half_lives": np.asarray(half_lives, dtype=np.float64),
+            "k": k, "survival": np.sum(tagged, axis=1) / n_traj,
+            "lambda": initiation, "T1_exp": t1,
+            "occupation": (on - off) / n_traj, "proteins": off / n_traj}
+
+
+def save_events(path, key, starts, arrivals, completions, offsets):
+    """
+        Saves recorded events under a temporary name and moves
+        the file into place.
+    """
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, key=key, starts=starts, arrivals=arrivals,
+             completions=completions, offsets=offsets)
+    os.replace(tmp, path)
+
+
+def load_events(path, key):
+    """
+        Reads events written by save_events. Returns None when
+        there are none and raises ValueError when they belong to
+        a different ensemble.
+    """
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as events:
+        if str(events["key"]) != key:
+            raise ValueError("events " + path +
+                             " belong to a different ensemble")
+        return (events["starts"], events["arrivals"],
+                events["completions"], events["offsets"])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Early time translation for many mRNA half-lives.")
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("rates", help="translation rates file")
+    parser.add_argument("--half-lives", default="60,120,300,600,1200,inf",
+                        help="mRNA half-lives (s), list or start:stop:num")
+    parser.add_argument("--horizon", type=float, default=1.5,
+                        help="simulated time in units of the analytical T1")
+    parser.add_argument("--alphas", default="Initiation-Rates.xlsx",
+                        help="initiation rates workbook")
+    parser.add_argument("--sheet", default="LacZ",
+                        help="sheet of the initiation rates workbook")
+    parser.add_argument("--column", default="B",
+                        help="column of the initiation rates")
+    parser.add_argument("--engine", choices=sorted(ensemble.EVENT_MODELS),
+                        default="python", help="trajectory engine")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of worker processes")
+    parser.add_argument("--seed", type=int, default=0, help="ensemble seed")
+    parser.add_argument("--events", default=None,
+                        help="file the recorded events are kept in, reused "
+                        "by later sweeps of the same ensemble")
+    args = parser.parse_args()
+
+    l, n_traj, n_meas = early_time.read_parameters(args.parameters)
+    gene = early_time.gene_name(args.rates)
+    alpha = load_initiation_rates(args.alphas, args.sheet,
+                                  args.column)[gene]
+    omegas = early_time.load_omegas(args.rates, alpha)
+    L = int(omegas.size)
+    exact_t1 = np.sum(np.reciprocal(omegas[1:]))
+    T = args.horizon * exact_t1
+    dt = T / n_meas
+    measure_times = np.arange(0, T, dt)
+
+    key = ensemble.ensemble_key(args.engine, l, alpha, omegas, T, 0,
+                                args.seed, 0) + " " + str(int(n_traj))
+    events = None if args.events is None else load_events(args.events, key)
+    if events is None:
+        events = ensemble.run_events(args.engine, n_traj, l, alpha, omegas,
+                                     T, args.seed, workers=args.workers)
+        if args.events is not None:
+            save_events(args.events, key, *events)
+    half_lives = parse_grid(args.half_lives)
+    result = reweight(*events, half_lives, measure_times)
+
+    with open(gene + "_decay.csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for i, half_life in enumerate(half_lives):
+            k = result["k"][i]
+            # The first initiation on the empty mRNA takes Exp(alpha).
+            writer.writerow([half_life, k, result["survival"][i],
+                             alpha / (alpha + k), result["lambda"][i],
+                             result["T1_exp"][i], result["proteins"][i, -1]])
+    np.savez(gene + "_decay_data.npz", measure_times=measure_times,
+             half_lives=result["half_lives"],
+             densities=result["occupation"] / (L - 1),
+             proteins=result["proteins"])
+    print(str(n_traj) + " trajectories, " + str(len(half_lives)) +
+          " half-lives written to " + gene + "_decay.csv")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+    ================================================================
+    Cached lookup of gene initiation rates. The rates are read from
+    a sheet of the initiation rates workbook once and kept in a
+    small .npz sidecar next to it, which is rebuilt whenever the
+    workbook changes.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import os
+import numpy as np
+
+
+def sidecar_path(workbook, sheet, column):
+    """
+        Path of the cache belonging to a sheet and column.
+    """
+    return "{}.{}.{}.npz".format(workbook, sheet, column)
+
+
+def read_workbook(workbook, sheet, column):
+    """
+        Reads gene names (column A) and initiation rates from a
+        sheet of the workbook. Rows without a numeric rate, e.g.
+        'NA', are left out.
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(workbook, read_only=True)
+    ws = wb[sheet]
+    col = openpyxl.utils.column_index_from_string(column) - 1
+    genes = []
+    alphas = []
+    for row in ws.iter_rows(min_row=2, values_only=True):
+        gene, alpha = row[0], row[col]
+        if gene is None or isinstance(alpha, bool) or \
+                not isinstance(alpha, (int, float)):
+            continue
+        genes.append(str(gene))
+        alphas.append(float(alpha))
+    wb.close()
+    return genes, alphas
+
+
+def load_initiation_rates(workbook, sheet="LacZ", column="B"):
+    """
+        Returns a dictionary of initiation rates keyed by gene.
+        The sidecar is used when its recorded modification time
+        and size match the workbook, otherwise the workbook is
+        read and the sidecar rewritten.
+    """
+    stat = os.stat(workbook)
+    sidecar = sidecar_path(workbook, sheet, column)
+    try:
+        with np.load(sidecar) as cache:
+            if int(cache["mtime_ns"]) == stat.st_mtime_ns and \
+                    int(cache["size"]) == stat.st_size:
+                return dict(zip(cache["genes"].tolist(),
+                                cache["alphas"].tolist()))
+    except (OSError, KeyError, ValueError):
+        pass
+
+    genes, alphas = read_workbook(workbook, sheet, column)
+    try:
+        # Written under a temporary name so readers never see a
+        # partial file.
+        tmp = sidecar + ".tmp.npz"
+        np.savez(tmp, genes=np.array(genes, dtype=str),
+                 alphas=np.array(alphas), mtime_ns=stat.st_mtime_ns,
+                 size=stat.st_size)
+        os.replace(tmp, sidecar)
+    except OSError:
+        # Read-only location, simply skip caching.
+        pass
+    return dict(zip(genes, alphas))
@@ -0,0 +1,230 @@
+"""
+    ================================================================
+    Mean-field approximations of the steady state of mRNA
+    translation for inhomogeneous rates and ribosomes covering l
+    codons (the l-TASEP). They run in milliseconds per gene and are
+    used to rank and pre-screen genes before Monte Carlo.
+
+    The early time density dynamics are integrated from the same
+    mean-field site equations with a stiff SciPy solver.
+
+    Usage: python mean_field.py <parameters file> <rates> [...]
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from initiation_rates import load_initiation_rates
+from RateStore import RateStore
+import early_time
+import genome_sweep
+import argparse
+import csv
+import numpy as np
+
+COLUMNS = ["Gene", "alpha", "CDS", "J", "density", "tau", "T1_ana",
+           "coverage", "regime", "needs_mc", "rates"]
+
+
+def isolated_time(omegas):
+    """
+        Mean time for a lone ribosome to cross the lattice.
+    """
+    return np.sum(np.reciprocal(omegas[1:]))
+
+
+def profile(J, omegas, l):
+    """
+        Steady state densities for a current J, solved from the
+        3' end backwards. A ribosome at site i hops at rate
+        omegas[i] when site i + l is free, with the mean-field
+        probability of Shaw, Zia and Lee,
+            J = omegas[i] rho[i] (1 - W[i]) / (1 - W[i] + rho[i + l])
+        where W[i] is the density summed over sites i + 1 to i + l
+        (sites past the end are empty). Returns None when no
+        profile with that current fits on the lattice.
+    """
+    L = omegas.size
+    rates = omegas.tolist()
+    rho = [0.0] * (L + l + 1)
+    # Running sum of rho over sites i + 1 to i + l.
+    W = 0.0
+    for i in range(L - 1, 0, -1):
+        W += rho[i + 1] - rho[i + l + 1]
+        if W >= 1.0:
+            return None
+        g = (1.0 - W) / (1.0 - W + rho[i + l])
+        rho[i] = J / (rates[i] * g)
+        # Site i and the l - 1 sites it covers behind it.
+        if rho[i] + W - rho[i + l] >= 1.0:
+            return None
+    return np.array(rho[:L])
+
+
+def steady_state(alpha, omegas, l, tol=1e-9):
+    """
+        Mean-field steady state of a gene. The current is found by
+        bisection so that the entry flux alpha (1 - sum of rho over
+        sites 1 to l) matches it. When no such current exists the
+        gene is elongation limited and the largest current the
+        lattice supports is returned. Returns a dictionary of the
+        current J, the density profile, the mean density (ribosomes
+        per codon, as in early_time), the mean time a ribosome
+        spends on the lattice (tau, by Little's law), the largest
+        local coverage and the regime.
+    """
+    omegas = np.asarray(omegas, dtype=float)
+    lo = 0.0
+    hi = min(alpha, np.min(omegas[1:]))
+    while hi - lo > tol * hi:
+        J = 0.5 * (lo + hi)
+        rho = profile(J, omegas, l)
+        if rho is not None and alpha * (1.0 - np.sum(rho[1:l + 1])) > J:
+            lo = J
+        else:
+            hi = J
+    J = lo
+    rho = profile(J, omegas, l)
+    entry = alpha * (1.0 - np.sum(rho[1:l + 1]))
+    limited = abs(entry - J) > 1e-6 * max(J, 1e-300)
+    # Fraction of codons covered by ribosomes around each site.
+    coverage = np.convolve(rho[1:], np.ones(l))[:omegas.size - 1]
+    return {"J": J, "rho": rho, "density": np.mean(rho[1:]),
+            "tau": np.sum(rho[1:]) / J if J > 0 else np.inf,
+            "coverage": np.max(coverage),
+            "regime": "elongation" if limited else "initiation"}
+
+
+def screen(alpha, omegas, l, max_coverage=0.3):
+    """
+        Mean-field summary of a gene for pre-screening. Monte Carlo
+        is flagged as needed where the approximation is expected to
+        be poor: elongation limited genes and genes where ribosomes
+        cover more than max_coverage of some stretch of the mRNA,
+        so that correlations between them matter.
+    """
+    result = steady_state(alpha, omegas, l)
+    result["T1_ana"] = isolated_time(omegas)
+    result["needs_mc"] = result["regime"] == "elongation" or \
+        result["coverage"] > max_coverage
+    return result
+
+
+def site_currents(rho, alpha, omegas, l):
+    """
+        Mean-field currents for a density profile rho (site 0 is
+        unused). Entry 0 is the initiation flux and entry i the
+        flux out of site i, the last being termination.
+    """
+    L = omegas.size
+    padded = np.zeros(L + l + 1)
+    padded[1:L] = rho[1:L]
+    cumulative = np.cumsum(padded)
+    sites = np.arange(1, L)
+    # Density summed over sites i + 1 to i + l, capped so the
+    # blocking probability stays finite far from steady state.
+    W = np.minimum(cumulative[sites + l] - cumulative[sites], 1.0 - 1e-12)
+    g = (1.0 - W) / (1.0 - W + padded[sites + l])
+    J = np.zeros(L)
+    J[0] = alpha * max(1.0 - (cumulative[l] - cumulative[0]), 0.0)
+    J[1:] = omegas[1:] * padded[1:L] * g
+    return J
+
+
+def density_dynamics(alpha, omegas, l, measure_times, method="BDF"):
+    """
+        Integrates the mean-field site occupancy equations
+            d rho[i] / dt = J[i - 1] - J[i]
+        from an empty lattice and returns the density on the
+        measurement grid, normalised like the density that
+        ProteinSynthesis.save_data writes in early_time, and the
+        full profiles of shape (times, sites). The Jacobian is
+        banded (site i couples to sites i - 1 to i + l), which
+        stiff solvers are told through jac_sparsity. Raises
+        RuntimeError when the solver fails.
+    """
+    from scipy.integrate import solve_ivp
+    from scipy.sparse import diags
+
+    omegas = np.asarray(omegas, dtype=float)
+    L = omegas.size
+    n = L - 1
+    sparsity = diags([np.ones(n - abs(k)) for k in range(-1, l + 1)],
+                     list(range(-1, l + 1)), shape=(n, n))
+
+    def rhs(t, y):
+        rho = np.zeros(L)
+        rho[1:] = y
+        J = site_currents(rho, alpha, omegas, l)
+        return J[:-1] - J[1:]
+
+    measure_times = np.asarray(measure_times, dtype=float)
+    kwargs = {}
+    if method in ("BDF", "Radau"):
+        kwargs["jac_sparsity"] = sparsity
+    solution = solve_ivp(rhs, (0.0, measure_times[-1]), np.zeros(n),
+                         method=method, t_eval=measure_times, **kwargs)
+    if not solution.success:
+        raise RuntimeError("mean-field integration failed: " +
+                           solution.message)
+    profiles = solution.y.T
+    return np.sum(profiles, axis=1) / n, profiles
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mean-field pre-screen of a set of genes.")
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("rates", nargs="+",
+                        help="rates directories, files or glob patterns "
+                        "(gene key patterns with --store)")
+    parser.add_argument("--store", default=None,
+                        help="rate store built by RateStore.py")
+    parser.add_argument("--alphas", default="Initiation-Rates.xlsx",
+                        help="initiation rates workbook")
+    parser.add_argument("--sheet", default="LacZ",
+                        help="sheet of the initiation rates workbook")
+    parser.add_argument("--column", default="B",
+                        help="column of the initiation rates")
+    parser.add_argument("--max-coverage", type=float, default=0.3,
+                        help="coverage above which Monte Carlo is needed")
+    parser.add_argument("--output", default="mean_field_screen.csv",
+                        help="results table, ranked by coverage")
+    args = parser.parse_args()
+
+    l, _, _ = early_time.read_parameters(args.parameters)
+    alpha_dict = load_initiation_rates(args.alphas, args.sheet, args.column)
+    if args.store is None:
+        genes = genome_sweep.find_rates(args.rates)
+    else:
+        store = RateStore(args.store)
+        genes = sorted(set(key for pattern in args.rates
+                           for key in store.keys(pattern)))
+
+    rows = []
+    for trans_params in genes:
+        gene = early_time.gene_name(trans_params)
+        if alpha_dict.get(gene) is None:
+            continue
+        alpha = float(alpha_dict[gene])
+        omegas = genome_sweep.load_omegas(trans_params, alpha, args.store)
+        result = screen(alpha, omegas, l, args.max_coverage)
+        rows.append({"Gene": gene, "alpha": alpha, "CDS": omegas.size - 1,
+                     "J": result["J"], "density": result["density"],
+                     "tau": result["tau"], "T1_ana": result["T1_ana"],
+                     "coverage": result["coverage"],
+                     "regime": result["regime"],
+                     "needs_mc": int(result["needs_mc"]),
+                     "rates": trans_params})
+    rows.sort(key=lambda row: row["coverage"], reverse=True)
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    print(str(sum(row["needs_mc"] for row in rows)) + " of " +
+          str(len(rows)) + " genes need Monte Carlo.")
+
+
+if __name__ == "__main__":
+    main()
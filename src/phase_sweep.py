@@ -0,0 +1,191 @@
+"""
+    ================================================================
+    A python script to sweep the steady state of mRNA translation
+    with uniform elongation rates over grids of alpha, beta and the
+    ribosome length l, e.g. to draw the TASEP phase diagram. Points
+    sharing l and beta form a chain over increasing alpha, each one
+    warm-started from the final lattice of the previous point.
+    Chains run in parallel and every point is written as one row of
+    a single table. Points whose steady state is not detected within
+    mcsteps events are not measured and marked as not detected.
+
+    Usage: python phase_sweep.py <parameters file> --alphas 0.1:0.9:9
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+from ProteinSynthesis import ProteinSynthesis
+import ensemble
+import argparse
+import csv
+import math
+import random
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+COLUMNS = ["l", "L", "alpha", "beta", "phase", "density", "current",
+           "burn_in", "t_s", "detected", "seed"]
+
+
+def parse_grid(text):
+    """
+        Parses either a comma separated list of values or a
+        start:stop:num range of evenly spaced values.
+    """
+    if ":" in text:
+        start, stop, num = text.split(":")
+        return np.linspace(float(start), float(stop), int(num)).tolist()
+    return [float(value) for value in text.split(",")]
+
+
+def read_parameters(path):
+    """
+        Reads the steady state parameters file used by
+        ProteinSynthesisTester.py. Returns l, L, alpha, beta,
+        mcsteps, n and tol.
+    """
+    with open(path, "r") as f:
+        items = f.readline().split(", ")
+    return (int(items[0]), int(items[1]), float(items[2]), float(items[3]),
+            int(items[4]), int(items[5]), float(items[6]))
+
+
+def phase(alpha, beta, l):
+    """
+        Phase of the l-TASEP with unit elongation rates. The
+        maximal current phase is entered once both alpha and beta
+        exceed the critical rate 1 / (1 + sqrt(l)).
+    """
+    critical = 1.0 / (1.0 + math.sqrt(l))
+    if alpha < beta and alpha < critical:
+        return "LD"
+    if beta < alpha and beta < critical:
+        return "HD"
+    if alpha >= critical and beta >= critical:
+        return "MC"
+    # On the coexistence line alpha == beta below critical.
+    return "LD/HD"
+
+
+def uniform_omegas(L, beta):
+    """
+        Unit elongation rates with detachment at rate beta.
+    """
+    omegas = np.ones(L)
+    omegas[0] = 0
+    omegas[-1] = beta
+    return omegas
+
+
+def run_point(simulation, mcsteps, n):
+    """
+        Burns in until steady state is detected (at most mcsteps
+        events) and then measures over mcsteps events. Returns the
+        mean density and current, the burn-in length in events,
+        the time measured and whether steady state was detected.
+        A point that never reaches steady state is not measured,
+        its density and current are NaN.
+    """
+    # Running clock.
+    t = 0.0
+    simulation.start_detection(t, n=n)
+    outcome = False
+    burn_in = 0
+    # Determine time to reach steady state.
+    while outcome == False and burn_in < mcsteps:
+        R = simulation.get_R()
+        t += simulation.get_random_time(R)
+        index = simulation.get_transition(R)
+        outcome = simulation.detect(t)
+        simulation.update(index)
+        burn_in += 1
+    if outcome == False:
+        return np.nan, np.nan, burn_in, 0.0, False
+    # Collect data after steady state reached.
+    simulation.start_measurement(t)
+    for i in range(mcsteps):
+        R = simulation.get_R()
+        t += simulation.get_random_time(R)
+        index = simulation.get_transition(R)
+        simulation.measure(index, t)
+        simulation.update(index)
+    return (np.mean(simulation.get_ss_densities(t)[1:]),
+            np.mean(simulation.get_ss_currents(t)), burn_in,
+            t - simulation.t_start, True)
+
+
+def run_chain(l, L, beta, alphas, mcsteps, n, seed):
+    """
+        Runs the points of one (l, beta) chain in order of
+        increasing alpha, each warm-started from the last lattice
+        of the previous one. Returns a list of table rows.
+    """
+    rng = random.Random(seed)
+    omegas = uniform_omegas(L, beta)
+    taus = None
+    rows = []
+    for alpha in sorted(alphas):
+        simulation = ProteinSynthesis(length=l, size=L, alpha=alpha,
+                                      omegas=omegas, rng=rng)
+        if taus is not None:
+            simulation.set_state(taus)
+        density, current, burn_in, t_s, detected = run_point(
+            simulation, mcsteps, n)
+        taus = simulation.taus.copy()
+        rows.append({"l": l, "L": L, "alpha": alpha, "beta": beta,
+                     "phase": phase(alpha, beta, l), "density": density,
+                     "current": current, "burn_in": burn_in, "t_s": t_s,
+                     "detected": detected, "seed": seed})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Steady state sweep over alpha, beta and l.")
+    parser.add_argument("parameters",
+                        help="parameters file, its values are the defaults")
+    parser.add_argument("--alphas", default=None,
+                        help="initiation rates, list or start:stop:num")
+    parser.add_argument("--betas", default=None,
+                        help="detachment rates, list or start:stop:num")
+    parser.add_argument("--lengths", default=None,
+                        help="comma separated ribosome lengths")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of parallel processes")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="base random seed of the chains")
+    parser.add_argument("--output", default="phase_sweep.csv",
+                        help="results table")
+    args = parser.parse_args()
+
+    l, L, alpha, beta, mcsteps, n, tol = read_parameters(args.parameters)
+    alphas = [alpha] if args.alphas is None else parse_grid(args.alphas)
+    betas = [beta] if args.betas is None else parse_grid(args.betas)
+    lengths = [l] if args.lengths is None else \
+        [int(value) for value in args.lengths.split(",")]
+
+    chains = [(l, beta) for l in lengths for beta in betas]
+    # Seeds depend only on the position of the chain, so results
+    # do not change with the number of workers.
+    jobs = [(l, L, beta, alphas, mcsteps, n,
+             ensemble.trajectory_seed(args.seed, i))
+            for i, (l, beta) in enumerate(chains)]
+    if args.workers > 1:
+        with ProcessPoolExecutor(max_workers=args.workers) as pool:
+            results = list(pool.map(run_chain, *zip(*jobs)))
+    else:
+        results = [run_chain(*job) for job in jobs]
+
+    with open(args.output, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        for rows in results:
+            writer.writerows(rows)
+    missed = sum(not row["detected"] for rows in results for row in rows)
+    print(str(len(chains) * len(alphas)) + " points written to " +
+          args.output + ", " + str(missed) + " without steady state.")
+
+
+if __name__ == "__main__":
+    main()
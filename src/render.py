@@ -0,0 +1,163 @@
+"""
+    ================================================================
+    Plotting of the simulation output, kept apart from the
+    simulations so that they never import matplotlib. Figures are
+    drawn with the non-interactive Agg backend and saved unless
+    show is asked for. Plots can also be drawn in a separate step
+    from the data files the drivers write.
+
+    Usage: python render.py density <gene>_density_data.dat [...]
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+import argparse
+import csv
+import os
+import numpy as np
+
+
+def pyplot(show=False):
+    """
+        Imports matplotlib.pyplot, with the Agg backend unless
+        the figures are to be shown.
+    """
+    import matplotlib
+    if not show:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def finish(plt, path, show):
+    """
+        Saves the current figure and shows or closes it.
+    """
+    plt.savefig(path)
+    if show:
+        plt.show()
+    else:
+        plt.close()
+
+
+def density_plot(x_data, y_data, t_1, gene, show=False):
+    """
+        Density plotter for mRNA strand.
+        t_1 - Time for first ribsome to terminate, not drawn
+              when None.
+    """
+    plt = pyplot(show)
+    plt.figure()
+    plt.title("Lattice Site Density" + " | Gene: " + gene)
+    plt.xlabel("Time (s)")
+    plt.ylabel(r"Denisty [$\rho$]")
+    plt.plot(x_data, y_data)
+    if t_1 is not None:
+        plt.axvline(x=t_1, color='r', linestyle='--')
+    plt.axhline(y=np.max(y_data), color='b', linestyle='--')
+    finish(plt, "density_plots/" + gene + "_plot.png", show)
+
+
+def ss_density_plot(x_data, y_data, show=False):
+    """
+        Density plotter for mRNA strand in
+        steady state.
+    """
+    plt = pyplot(show)
+    plt.figure(figsize=(10,8))
+    plt.title("Lattice Site Density", fontsize = 21)
+    plt.xlabel("Time (s)", fontsize = 16)
+    plt.ylabel(r"Denisty [$\rho$]", fontsize = 16)
+    plt.ylim(0.2, 0.5)
+    plt.plot(x_data, y_data, 'g')
+    plt.xticks(fontsize = 16)
+    plt.yticks(fontsize = 16)
+    finish(plt, "ss_density.png", show)
+
+
+def current_plot(x_data, y_data, show=False):
+    """
+        Current plotter for mRNA strand.
+    """
+    plt = pyplot(show)
+    plt.figure(figsize=(10,8))
+    plt.title("Lattice Site Current", fontsize = 21)
+    plt.xlabel("Lattice Site", fontsize = 16)
+    plt.ylabel("Current [J]", fontsize = 16)
+    plt.ylim(0.1, 0.3)
+    plt.plot(x_data, y_data, 'r')
+    plt.xticks(fontsize = 16)
+    plt.yticks(fontsize = 16)
+    finish(plt, "ss_current.png", show)
+
+
+def read_data(path):
+    """
+        Reads an "x, y" data file written by the drivers.
+    """
+    data = np.loadtxt(path, delimiter=",", ndmin=2)
+    return data[:, 0], data[:, 1]
+
+
+def read_t1(table):
+    """
+        Mean T1 of every gene of a genome_sweep results table.
+    """
+    with open(table, "r", newline="") as f:
+        return {row["Gene"]: float(row["T1_exp"])
+                for row in csv.DictReader(f)}
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Draw plots from the data files of the drivers.")
+    parser.add_argument("kind", choices=["density", "ss_density", "current"],
+                        help="early time density (<gene>_density_data.dat), "
+                        "steady state density or steady state current")
+    parser.add_argument("data", nargs="+",
+                        help="data files, or rates keys or gene names "
+                        "with --h5")
+    parser.add_argument("--t1", type=float, default=None,
+                        help="mean T1 marked on a density plot")
+    parser.add_argument("--table", default=None,
+                        help="genome_sweep table to take each gene's T1 from")
+    parser.add_argument("--h5", default=None,
+                        help="DensityStore to read the density of genes from")
+    parser.add_argument("--show", action="store_true",
+                        help="show the figures as well as saving them")
+    args = parser.parse_args()
+
+    t1s = {} if args.table is None else read_t1(args.table)
+    if args.h5 is not None:
+        from DensityStore import DensityStore
+        store = DensityStore(args.h5)
+        keys = [key for name in args.data for key in
+                ([name] if name in store else store.find(name))]
+        entries = store.read(keys)
+        genes = [entry["Gene"] for entry in entries.values()]
+        for key, entry in entries.items():
+            gene = entry["Gene"]
+            # Tell apart the same gene from different rate sets.
+            if genes.count(gene) > 1:
+                gene += "_" + os.path.basename(os.path.dirname(key))
+            t1 = entry["T1_exp"]
+            density_plot(entry["measure_times"], entry["densities"],
+                         None if np.isnan(t1) else t1, gene, args.show)
+        return
+    for path in args.data:
+        x_data, y_data = read_data(path)
+        if args.kind == "ss_density":
+            ss_density_plot(x_data, y_data, args.show)
+        elif args.kind == "current":
+            current_plot(x_data, y_data, args.show)
+        else:
+            gene = os.path.basename(path)
+            if gene.endswith("_density_data.dat"):
+                gene = gene[:-len("_density_data.dat")]
+            density_plot(x_data, y_data, t1s.get(gene, args.t1), gene,
+                         args.show)
+
+
+if __name__ == "__main__":
+    main()
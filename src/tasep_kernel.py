@@ -0,0 +1,164 @@
+"""
+    ================================================================
+    Compiled Gillespie kernels for the TASEP model of mRNA
+    translation. Whole trajectories, or blocks of events, run in a
+    single nopython call over the taus/a/omegas arrays. When Numba
+    is not installed the same functions run as plain Python.
+    ================================================================
+    Author: C. Abbott
+    Version: Feb 2020
+    ================================================================
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit
+    HAVE_NUMBA = True
+except ImportError:
+    HAVE_NUMBA = False
+
+    def njit(*args, **kwargs):
+        """
+            Stand-in decorator used when Numba is missing.
+        """
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True)
+def seed(value):
+    """
+        Seeds the random number generator used by the kernels.
+    """
+    np.random.seed(value)
+
+
+@njit(cache=True)
+def build_arrays(size, alpha):
+    """
+        Creates an empty lattice and its propensity array.
+    """
+    taus = np.zeros(size, dtype=np.int64)
+    a = np.zeros(size)
+    a[0] = alpha
+    return taus, a
+
+
+@njit(cache=True)
+def select(a, R):
+    """
+        Finds the index of the transition which occurs.
+    """
+    r = np.random.random() * R
+    total = a[0]
+    j = 0
+    while total < r and j < a.size - 1:
+        total += a[j + 1]
+        j += 1
+    return j
+
+
+@njit(cache=True)
+def update(taus, a, omegas, alpha, length, index):
+    """
+        Realises the transition at index, following the same
+        rules as ProteinSynthesis.update.
+    """
+    size = taus.size
+    # Initiation.
+    if index == 0:
+        taus[1] = 1
+        a[0] = 0.0
+        a[1] = omegas[1] * (1 - taus[length + 1])
+    # Detaching from lattice.
+    elif index == size - 1:
+        taus[index] = 0
+        a[index] = 0.0
+        a[index - length] = omegas[index - length] * taus[index - length]
+    # Elongation.
+    else:
+        taus[index] = 0
+        taus[index + 1] = 1
+        a[index] = 0.0
+        if index + 1 + length < size:
+            a[index + 1] = omegas[index + 1] * \
+                (1 - taus[index + 1 + length])
+        else:
+            a[index + 1] = omegas[index + 1]
+        # Initiation site freed or ribosome behind unblocked.
+        if index == length:
+            a[0] = alpha
+        elif index > length:
+            a[index - length] = omegas[index - length] * \
+                taus[index - length]
+
+
+@njit(cache=True)
+def run_events(taus, a, omegas, alpha, length, n_events, densities, currents):
+    """
+        Performs a block of n_events transitions. The time weighted
+        occupation of every site is added to densities and each
+        hop is counted in currents. Returns the elapsed time.
+    """
+    elapsed = 0.0
+    for i in range(n_events):
+        R = a.sum()
+        dt = -math.log(1.0 - np.random.random()) / R
+        elapsed += dt
+        for j in range(taus.size):
+            densities[j] += taus[j] * dt
+        index = select(a, R)
+        currents[index] += 1
+        update(taus, a, omegas, alpha, length, index)
+    return elapsed
+
+
+@njit(cache=True)
+def run_trajectory(omegas, alpha, length, T, dt, n_meas):
+    """
+        Runs one early time trajectory up to the horizon T.
+        Returns the occupation number on the measurement grid,
+        the initiation time of the tagged (first) ribosome and
+        its time to reach the end of the lattice. Times which
+        were not reached are NaN.
+    """
+    size = omegas.size
+    taus, a = build_arrays(size, alpha)
+    traj_densities = np.zeros(n_meas + 1)
+    occupation = 0
+    ribosome_pos = 1
+    check = False
+    initiation_time = np.nan
+    t1 = np.nan
+    t_old = 0.0
+    t_new = 0.0
+    while t_new <= T:
+        k1 = int(math.floor(t_old / dt)) + 1
+        R = a.sum()
+        t_new += -math.log(1.0 - np.random.random()) / R
+        k2 = int(math.floor(t_new / dt))
+        # Final loop check.
+        if t_new > T:
+            k2 = n_meas
+        for k in range(k1, min(k2, n_meas) + 1):
+            traj_densities[k] = occupation
+        t_old = t_new
+        index = select(a, R)
+        update(taus, a, omegas, alpha, length, index)
+        # Bookkeeping of the ribosome count.
+        if index == 0:
+            occupation += 1
+        elif index == size - 1:
+            occupation -= 1
+        # Tracking initial ribosome position.
+        if not check and index + 1 == ribosome_pos:
+            ribosome_pos += 1
+            if ribosome_pos == 2:
+                initiation_time = t_new
+            if ribosome_pos > size - 1:
+                t1 = t_new - initiation_time
+                check = True
+    return traj_densities, initiation_time, t1
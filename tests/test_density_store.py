@@ -0,0 +1,43 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "src"))
+pytest.importorskip("h5py")
+from DensityStore import DensityStore, merge, shard_path
+
+
+def row(rates, value):
+    return {"Gene": "xseB", "rates": rates, "measure_times": np.arange(3.0),
+            "densities": np.full(3, value), "T1_exp": value}
+
+
+def test_merge_keeps_a_gene_from_every_rate_set(tmp_path):
+    path = str(tmp_path / "store.h5")
+    DensityStore(shard_path(path, 1)).append(
+        [row("growth-rate-0_7/xseB_rates.dat", 1.0),
+         row("growth-rate-1_6/xseB_rates.dat", 2.0)])
+    DensityStore(shard_path(path, 2)).append(
+        [row("growth-rate-2_5/xseB_rates.dat", 3.0)])
+    assert merge(path) == 2
+    store = DensityStore(path)
+    keys = store.find("xseB")
+    assert len(keys) == 3
+    entries = store.read(keys)
+    assert [entries[key]["T1_exp"] for key in keys] == [1.0, 2.0, 3.0]
+    assert np.all(entries[keys[2]]["densities"] == 3.0)
+
+
+def test_merge_of_one_shard_leaves_the_others(tmp_path):
+    path = str(tmp_path / "store.h5")
+    DensityStore(shard_path(path, 1)).append(
+        [row("growth-rate-0_7/xseB_rates.dat", 1.0)])
+    DensityStore(shard_path(path, 2)).append(
+        [row("growth-rate-1_6/xseB_rates.dat", 2.0)])
+    assert merge(path, [shard_path(path, 2)]) == 1
+    assert DensityStore(path).keys() == ["growth-rate-1_6/xseB_rates.dat"]
+    assert os.path.exists(shard_path(path, 1))
+    assert not os.path.exists(shard_path(path, 2))
@@ -0,0 +1,26 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "src"))
+import ensemble
+
+
+def run(engine, n_traj, prefix=None):
+    omegas = np.linspace(2.0, 5.0, 30)
+    omegas[0] = 0.5
+    T = 1.5 * np.sum(np.reciprocal(omegas[1:]))
+    return ensemble.run_ensemble(engine, n_traj, 3, 0.5, omegas, T, T / 20,
+                                 20, 11, batch_size=100, prefix=prefix)
+
+
+def test_topped_up_prefix_matches_fresh_run():
+    for engine in ("python", "batched"):
+        fresh = run(engine, 300)
+        for n in (100, 150):
+            cached = run(engine, n)
+            topped_up = run(engine, 300, prefix=(n,) + cached)
+            for a, b in zip(fresh, topped_up):
+                assert np.array_equal(a, b), (engine, n)
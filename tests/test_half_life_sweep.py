@@ -0,0 +1,30 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "src"))
+import ensemble
+from half_life_sweep import reweight
+
+
+def test_infinite_half_life_matches_run_ensemble():
+    rng = np.random.default_rng(3)
+    omegas = rng.uniform(2.0, 6.0, 40)
+    alpha = 0.8
+    omegas[0] = alpha
+    l, n_traj, n_meas, seed = 3, 50, 40, 7
+    T = 1.5 * np.sum(np.reciprocal(omegas[1:]))
+    dt = T / n_meas
+    densities, initiation_times, tagged_times = ensemble.run_ensemble(
+        "python", n_traj, l, alpha, omegas, T, dt, n_meas, seed)
+    events = ensemble.run_events("python", n_traj, l, alpha, omegas, T, seed)
+    result = reweight(*events, [np.inf, 10.0],
+                      np.arange(n_meas + 1) * dt)
+    assert np.allclose(result["occupation"][0] * n_traj, densities)
+    assert np.isclose(result["lambda"][0], np.mean(initiation_times))
+    assert np.isclose(result["T1_exp"][0], np.mean(tagged_times))
+    # Decay only removes ribosomes.
+    assert np.all(result["occupation"][1] <= result["occupation"][0] + 1e-12)
+    assert result["survival"][1] < result["survival"][0]
@@ -0,0 +1,14 @@
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                os.pardir, "src"))
+from phase_sweep import run_chain
+
+
+def test_point_without_steady_state_is_marked_and_not_measured():
+    rows = run_chain(1, 50, 0.7, [0.3], 100, 10, 0)
+    assert rows[0]["detected"] is False
+    assert math.isnan(rows[0]["density"]) and math.isnan(rows[0]["current"])
+    assert rows[0]["t_s"] == 0.0
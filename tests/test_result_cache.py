@@ -0,0 +1,25 @@
+import os
+import sys
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                   "src")
+sys.path.insert(0, SRC)
+import early_time
+import RateStore
+from ResultCache import ResultCache
+
+
+def test_key_does_not_depend_on_where_rates_come_from(tmp_path):
+    (tmp_path / "rates").mkdir()
+    trans_params = str(tmp_path / "rates" / "gene_rates.dat")
+    with open(trans_params, "w") as f:
+        f.writelines("{} {}\n".format(codon, rate) for codon, rate in
+                     (("AUG", 5.5), ("GCU", 12.25), ("UAA", 3.0)))
+    RateStore.build(str(tmp_path / "rates"), str(tmp_path / "store"))
+    alpha = 0.4
+    from_file = early_time.load_omegas(trans_params, alpha)
+    from_store = RateStore.RateStore(str(tmp_path / "store")).omegas("gene")
+    cache = ResultCache(str(tmp_path / "cache"))
+    args = ("python", 10, alpha)
+    assert cache.key(*args, from_file, 3.0, 10, 1, 1024) == \
+        cache.key(*args, from_store, 3.0, 10, 1, 1024)
@@ -0,0 +1,49 @@
+import os
+import random
+import subprocess
+import sys
+
+import numpy as np
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                   "src")
+sys.path.insert(0, SRC)
+from ProteinSynthesis import ProteinSynthesis
+
+
+def test_run_too_short_to_detect(tmp_path):
+    # 100 events never fill the 2 * 10 batches of 10 events.
+    (tmp_path / "params.txt").write_text("1, 50, 0.3, 0.7, 100, 10, 0.01")
+    result = subprocess.run(
+        [sys.executable, os.path.join(SRC, "ProteinSynthesisTester.py"),
+         "params.txt", "--no-plot"],
+        cwd=tmp_path, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert "Steady state not detected" in result.stdout
+    assert not (tmp_path / "ss_density_data.dat").exists()
+
+
+def test_detection_waits_for_the_lattice_to_fill():
+    L, alpha, beta = 100, 0.2, 0.7
+    omegas = np.ones(L)
+    omegas[0] = 0
+    omegas[-1] = beta
+    # The front of the low density phase enters at speed 1 - alpha.
+    fill_time = L / (1 - alpha)
+    for seed in range(5):
+        simulation = ProteinSynthesis(length=1, size=L, alpha=alpha,
+                                      omegas=omegas, rng=random.Random(seed))
+        simulation.start_detection(0.0, n=10)
+        t = 0.0
+        detected = False
+        for i in range(200000):
+            R = simulation.get_R()
+            t += simulation.get_random_time(R)
+            index = simulation.get_transition(R)
+            if simulation.detect(t):
+                detected = True
+                break
+            simulation.update(index)
+        assert detected
+        assert t > fill_time
+        assert simulation.t_burn_in_error > 0